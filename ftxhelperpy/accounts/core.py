@@ -1,6 +1,54 @@
-from ftxhelperpy.utils.connect import Connector
+from typing import NamedTuple, Optional
+
+from ftxhelperpy.utils.connect import Connector, unwrap
+
+class AccountInfo(NamedTuple):
+    """Snapshot of the information related to the account. Fields
+    match the keys of the FTX response"""
+
+    accountIdentifier: int
+    username: str
+    collateral: float
+    freeCollateral: float
+    totalAccountValue: float
+    totalPositionSize: float
+    initialMarginRequirement: float
+    maintenanceMarginRequirement: float
+    # the margin fractions are null when there are no open positions
+    marginFraction: Optional[float]
+    openMarginFraction: Optional[float]
+    liquidating: bool
+    backstopProvider: bool
+    positions: list
+    takerFee: float
+    makerFee: float
+    leverage: float
+    positionLimit: Optional[float]
+    positionLimitUsed: Optional[float]
+    useFttCollateral: bool
+    chargeInterestOnNegativeUsd: bool
+    spotMarginEnabled: bool
+    spotLendingEnabled: bool
+
+    @classmethod
+    def from_result(cls, result: dict) -> 'AccountInfo':
+        """Creates an AccountInfo from the result of an account request.
+        Numeric fields are converted to floats and keys which are not
+        fields are ignored"""
+
+        values = []
+        for field, field_type in cls.__annotations__.items():
+            value = result.get(field)
+            if value is not None and field_type in (float, Optional[float]):
+                value = float(value)
+            values.append(value)
+
+        return cls(*values)
 
 class Account:
+
+    __slots__ = ('connector',)
+
     def __init__(self, Connector: type[Connector]):
         self.connector = Connector
 
@@ -16,9 +64,11 @@ class Account:
         'chargeInterestOnNegativeUsd', 'spotMarginEnabled', 'spotLendingEnabled']"""
 
         endpoint = "account"
-        response = self.connector.auth_get_request(endpoint).json()
+        return unwrap(self.connector.auth_get_json(endpoint))
 
-        if response['success'] == False:
-            raise Exception(response['error'])
+    def get_info_typed(self) -> AccountInfo:
+        """Returns the information related to the account as an AccountInfo,
+        which is cheaper to hold and read fields from than the dictionary
+        returned by get_info"""
 
-        return response['result']
\ No newline at end of file
+        return AccountInfo.from_result(self.get_info())
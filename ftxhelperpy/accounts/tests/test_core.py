@@ -1,7 +1,7 @@
 import os
 import unittest
 
-from ftxhelperpy.accounts.core import Account
+from ftxhelperpy.accounts.core import Account, AccountInfo
 from ftxhelperpy.utils.connect import Connector
 
 class TestAccountMethods(unittest.TestCase):
@@ -9,6 +9,7 @@ class TestAccountMethods(unittest.TestCase):
     @classmethod
     def setUpClass(cls) -> None:
         connector = Connector()
+        cls.addClassCleanup(connector.close)
         cls.account = Account(connector)
 
     def setUp(self) -> None:
@@ -19,5 +20,11 @@ class TestAccountMethods(unittest.TestCase):
         self.assertIsInstance(info, dict)
         self.assertGreater(len(info), 0)
 
+    def test_get_info_typed(self):
+        info = self.account.get_info_typed()
+        self.assertIsInstance(info, AccountInfo)
+        self.assertIsInstance(info.collateral, float)
+        self.assertIsInstance(info.positions, list)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,140 @@
+import math
+import numpy as np
+
+try:
+    from numba import njit, types
+except ImportError:
+    njit = None
+
+def _log_returns_loop(close: np.ndarray) -> np.ndarray:
+    out = np.empty(close.size)
+    if close.size == 0:
+        return out
+
+    out[0] = np.nan
+    for i in range(1, close.size):
+        out[i] = math.log(close[i] / close[i - 1])
+    return out
+
+def _rolling_vwap_loop(price: np.ndarray, volume: np.ndarray, window: int) -> np.ndarray:
+    out = np.empty(price.size)
+    notional_sum = 0.0
+    volume_sum = 0.0
+
+    for i in range(price.size):
+        notional_sum += price[i] * volume[i]
+        volume_sum += volume[i]
+
+        # drop the value which has just left the window
+        if i >= window:
+            notional_sum -= price[i - window] * volume[i - window]
+            volume_sum -= volume[i - window]
+
+        if i < window - 1 or volume_sum == 0:
+            out[i] = np.nan
+        else:
+            out[i] = notional_sum / volume_sum
+    return out
+
+def _bucket_trades_loop(ts_ns: np.ndarray, price: np.ndarray, size: np.ndarray, bucket_ns: int,
+                        out_start: np.ndarray, out_open: np.ndarray, out_high: np.ndarray,
+                        out_low: np.ndarray, out_close: np.ndarray, out_volume: np.ndarray,
+                        out_notional: np.ndarray, out_count: np.ndarray) -> int:
+    n = -1
+    current_bucket = 0
+
+    for i in range(ts_ns.size):
+        bucket = ts_ns[i] - ts_ns[i] % bucket_ns
+
+        # trades are sorted by time so a new bucket means the previous one is finished
+        if n < 0 or bucket != current_bucket:
+            n += 1
+            current_bucket = bucket
+            out_start[n] = bucket
+            out_open[n] = price[i]
+            out_high[n] = price[i]
+            out_low[n] = price[i]
+            out_volume[n] = 0.0
+            out_notional[n] = 0.0
+            out_count[n] = 0
+
+        if price[i] > out_high[n]:
+            out_high[n] = price[i]
+        if price[i] < out_low[n]:
+            out_low[n] = price[i]
+        out_close[n] = price[i]
+        out_volume[n] += size[i]
+        out_notional[n] += price[i] * size[i]
+        out_count[n] += 1
+
+    return n + 1
+
+def _log_returns_numpy(close: np.ndarray) -> np.ndarray:
+    out = np.empty(close.size)
+    if close.size == 0:
+        return out
+
+    out[0] = np.nan
+    out[1:] = np.log(close[1:] / close[:-1])
+    return out
+
+def _rolling_vwap_numpy(price: np.ndarray, volume: np.ndarray, window: int) -> np.ndarray:
+    notional_sum = np.cumsum(price * volume, dtype=np.float64)
+    volume_sum = np.cumsum(volume, dtype=np.float64)
+    notional_sum[window:] = notional_sum[window:] - notional_sum[:-window]
+    volume_sum[window:] = volume_sum[window:] - volume_sum[:-window]
+
+    out = np.full(price.size, np.nan)
+    valid = volume_sum != 0
+    valid[:window - 1] = False
+    out[valid] = notional_sum[valid] / volume_sum[valid]
+    return out
+
+def _bucket_trades_numpy(ts_ns: np.ndarray, price: np.ndarray, size: np.ndarray, bucket_ns: int,
+                         out_start: np.ndarray, out_open: np.ndarray, out_high: np.ndarray,
+                         out_low: np.ndarray, out_close: np.ndarray, out_volume: np.ndarray,
+                         out_notional: np.ndarray, out_count: np.ndarray) -> int:
+    if ts_ns.size == 0:
+        return 0
+
+    buckets = ts_ns - ts_ns % bucket_ns
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], ts_ns.size]
+    n = starts.size
+
+    out_start[:n] = buckets[starts]
+    out_open[:n] = price[starts]
+    out_high[:n] = np.maximum.reduceat(price, starts)
+    out_low[:n] = np.minimum.reduceat(price, starts)
+    out_close[:n] = price[ends - 1]
+    out_volume[:n] = np.add.reduceat(size, starts)
+    out_notional[:n] = np.add.reduceat(price * size, starts)
+    out_count[:n] = ends - starts
+    return n
+
+if njit is not None:
+    # the inputs are typed as read only, as pandas hands back read only arrays under copy on
+    # write. Writable arrays are accepted by the same signatures as the kernels never modify them
+    _f64_in = types.Array(types.float64, 1, 'A', readonly=True)
+    _f32_in = types.Array(types.float32, 1, 'A', readonly=True)
+    _i64_in = types.Array(types.int64, 1, 'A', readonly=True)
+    _f64_out = types.float64[:]
+    _i64_out = types.int64[:]
+
+    # compiled eagerly for the candle dtypes so the first call does not pay for the jit
+    log_returns = njit([_f64_out(_f64_in), _f64_out(_f32_in)], cache=True)(_log_returns_loop)
+    _rolling_vwap = njit([_f64_out(_f64_in, _f64_in, types.int64),
+                          _f64_out(_f32_in, _f32_in, types.int64)], cache=True)(_rolling_vwap_loop)
+    bucket_trades = njit([types.int64(_i64_in, _f64_in, _f64_in, types.int64, _i64_out, _f64_out, _f64_out,
+                                      _f64_out, _f64_out, _f64_out, _f64_out, _i64_out)],
+                         cache=True)(_bucket_trades_loop)
+else:
+    log_returns = _log_returns_numpy
+    _rolling_vwap = _rolling_vwap_numpy
+    bucket_trades = _bucket_trades_numpy
+
+def rolling_vwap(price: np.ndarray, volume: np.ndarray, window: int) -> np.ndarray:
+    # checked here as the two implementations fail differently on a window of zero or less
+    if window < 1:
+        raise ValueError(f"Window must be at least 1: {window}")
+    return _rolling_vwap(price, volume, window)
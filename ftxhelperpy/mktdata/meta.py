@@ -1,9 +1,23 @@
+import numpy as np
 import pandas as pd
 
-from ftxhelperpy.utils.connect import Connector
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+from ftxhelperpy.utils.connect import Connector, unwrap
 
 class MetaDataFetcher:
 
+    __slots__ = ('connector',)
+
+    # numeric columns of the futures response and the dtype they are built with
+    _FUTURE_DTYPES = {'priceIncrement': 'float64', 'sizeIncrement': 'float64', 'last': 'float64',
+                      'bid': 'float64', 'ask': 'float64', 'index': 'float64', 'mark': 'float64',
+                      'imfFactor': 'float64', 'lowerBound': 'float64', 'upperBound': 'float64',
+                      'marginPrice': 'float64', 'positionLimitWeight': 'float64',
+                      'change1h': 'float64', 'change24h': 'float64', 'changeBod': 'float64',
+                      'volumeUsd24h': 'float64', 'volume': 'float64', 'openInterest': 'float64',
+                      'openInterestUsd': 'float64'}
+
     def __init__(self, Connector: type[Connector]):
         self.connector = Connector
 
@@ -11,7 +25,8 @@ class MetaDataFetcher:
         """Returns a pandas dataframe of all currently active futures.
 
             Args:
-                sort_by: Column name to sort by in descending order (optional)
+                sort_by: Column name to sort by in descending order (optional).
+                If None the futures are returned in the order FTX sends them
 
             Returns:
                 A pandas dataframe with columns (at time of writing) for
@@ -24,13 +39,46 @@ class MetaDataFetcher:
                'openInterestUsd']"""
 
         endpoint = "futures"
-        response = self.connector.auth_get_request(endpoint).json()
+        result = unwrap(self.connector.auth_get_json(endpoint))
+
+        futures_df = self._rows_to_columns(result)
+        if sort_by is None:
+            return futures_df
+
+        column = futures_df[sort_by]
+        if is_numeric_dtype(column) and not is_bool_dtype(column):
+            # negating keeps NaNs at the end, the same as sort_values(ascending=False)
+            order = np.argsort(-column.to_numpy(), kind='stable')
+            futures_df = futures_df.take(order)
+            # set the index directly as reset_index would copy every column again
+            futures_df.index = pd.RangeIndex(len(futures_df))
+            return futures_df
+
+        return futures_df.sort_values(by=sort_by, ascending=False, ignore_index=True)
+
+    def _rows_to_columns(self, rows: list) -> pd.DataFrame:
+        """Builds a pandas dataframe column by column from the list of futures,
+        using _FUTURE_DTYPES for the numeric columns rather than letting pandas infer them
 
-        if response['success']==False:
-            raise Exception(response['error'])
+            Args:
+                rows: The list of dictionaries in the 'result' field of the response
+
+            Returns:
+                A pandas dataframe with a column for each key in the rows
+        """
+
+        if len(rows)==0:
+            return pd.DataFrame()
 
-        futures_df = pd.DataFrame.from_dict(response['result']).sort_values(by=sort_by, ascending=False).reset_index(drop=True)
-        return futures_df
+        columns = {}
+        for key in rows[0]:
+            values = [row.get(key) for row in rows]
+            if key in self._FUTURE_DTYPES:
+                # missing values (e.g. no mark for a future that has not started) become NaN
+                values = np.asarray(values, dtype=self._FUTURE_DTYPES[key])
+            columns[key] = values
+
+        return pd.DataFrame(columns)
 
     def get_future(self, fut_symbol: str) -> dict:
         """Returns a dictionary representing a single future.
@@ -48,10 +96,5 @@ class MetaDataFetcher:
                'changeBod', 'volumeUsd24h', 'volume', 'openInterest',
                'openInterestUsd']"""
 
-        endpoint = "futures/{0}".format(fut_symbol)
-        response = self.connector.auth_get_request(endpoint).json()
-
-        if response['success']==False:
-            raise Exception(response['error'])
-
-        return response['result']
\ No newline at end of file
+        endpoint = f"futures/{fut_symbol}"
+        return unwrap(self.connector.auth_get_json(endpoint))
\ No newline at end of file
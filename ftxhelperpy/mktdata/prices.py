@@ -1,72 +1,188 @@
+import asyncio
+import math
+import numpy as np
 import pandas as pd
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dateutil import parser
+from functools import lru_cache
+from typing import Callable, Optional
 
-from ftxhelperpy.utils.connect import Connector
+from ftxhelperpy.mktdata import _kernels
+from ftxhelperpy.utils import cache
+from ftxhelperpy.utils.connect import Connector, unwrap
+
+# pandas 2 infers one format from the first string and rejects any that differ, but FTX leaves
+# out the fractional seconds when they are zero. ISO8601 parses each string on its own.
+# pandas 1 does not have the option and already copes with the mix
+_ISO8601_KWARGS = {'format': 'ISO8601'} if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+@lru_cache(maxsize=4096)
+def _candles_endpoint(symbol: str) -> str:
+    """Returns the candles endpoint for a market symbol"""
+
+    return f"markets/{symbol}/candles"
+
+@lru_cache(maxsize=4096)
+def _ts(value) -> float:
+    """Returns a timestamp for a datetime. Timestamps are returned as they are"""
+
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+def _earliest_ms(page: list) -> float:
+    """Returns the earliest 'time' on a page of candles as a timestamp"""
+
+    # pages are in time order so the earliest row is at one end or the other
+    return min(page[0]['time'], page[-1]['time']) / 1000
+
+def _earliest_iso(page: list) -> float:
+    """Returns the earliest 'time' on a page of rates or trades as a timestamp"""
+
+    # pages are in time order (newest first for trades) so only the ends are compared.
+    # The times all have the same offset so the earliest string is the earliest time
+    # fromisoformat is implemented in C and is far cheaper than pd.Timestamp for one string
+    return datetime.fromisoformat(min(page[0]['time'], page[-1]['time'])).timestamp()
 
 class HistDataFetcher:
 
-    def __init__(self, Connector: type[Connector]):
+    __slots__ = ('connector', 'cache_dir', 'memory_cache')
+
+    # numeric columns of each response type and the dtype they are built with
+    _CANDLE_DTYPES = {'time': 'int64', 'open': 'float64', 'high': 'float64',
+                      'low': 'float64', 'close': 'float64', 'volume': 'float64'}
+    _RATE_DTYPES = {'rate': 'float64'}
+    _TRADE_DTYPES = {'id': 'int64', 'price': 'float64', 'size': 'float64'}
+    # dtypes used instead when compact=True
+    _CANDLE_COMPACT_DTYPES = {**_CANDLE_DTYPES, 'open': 'float32', 'high': 'float32',
+                              'low': 'float32', 'close': 'float32', 'volume': 'float32'}
+    _TRADE_COMPACT_DTYPES = {**_TRADE_DTYPES, 'price': 'float32', 'size': 'float32', 'side': 'category'}
+    # maximum number of candles FTX returns in one response
+    _CANDLES_PER_PAGE = 1500
+    # candle sizes in seconds that FTX supports, which includes any number of days up to 30
+    _CANDLE_RESOLUTIONS = frozenset((15, 60, 300, 900, 3600, 14400) + tuple(86400 * i for i in range(1, 31)))
+
+    def __init__(self, Connector: type[Connector], cache_dir: Optional[str] = None,
+                 memory_cache_ttl: Optional[float] = None):
         self.connector = Connector
+        # directory for caching results of requests for windows that are fully in the past
+        self.cache_dir = cache_dir
+        # in-memory cache of recent results, so repeated requests within the ttl are not refetched
+        self.memory_cache = None if memory_cache_ttl is None else cache.MemoryCache(ttl=memory_cache_ttl)
 
-    def _format_prices(self, response: dict, include_return: bool) -> pd.DataFrame:
-        """Converts the response from a historical prices request to a pandas dataframe
+    def _get_or_fetch(self, endpoint: str, params: dict, end_time: float, settle_secs: float,
+                      fetch_fn: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Returns the result of fetch_fn, from the memory cache if it is enabled and
+        the result is recent enough, or from the disk cache if it is enabled and the
+        window has finished
 
             Args:
-                response: The json data of a response object from a historical prices request
+                endpoint: The endpoint of the request
+                params: Everything that changes the result (query parameters and formatting options)
+                end_time: End of the interval of time being requested as a timestamp
+                settle_secs: How long after end_time the data can still change
+                fetch_fn: Function with no arguments which fetches the dataframe
 
             Returns:
-                A pandas dataframe with columns for start time, time,
-                open, high, low, close, volume
+                A pandas dataframe
         """
 
-        prices_dict = response['result']
-        if len(prices_dict)==0:
-            return pd.DataFrame()
+        if self.cache_dir is None and self.memory_cache is None:
+            return fetch_fn()
 
-        prices_df = pd.DataFrame.from_dict(prices_dict).sort_values(by='time', ascending=True).reset_index(drop=True)
-        prices_df['startTime'] = prices_df['startTime'].apply(lambda x: parser.parse(x))
+        key = cache.make_key(endpoint, params)
+        # data for a window which has not finished can still change, so it is never cached on disk
+        fetch = fetch_fn
+        if self.cache_dir is not None and end_time <= time.time() - settle_secs:
+            fetch = lambda: cache.get_or_fetch(self.cache_dir, key, fetch_fn)
 
-        if include_return:
-            prices_df = self._calc_returns(prices_df)
+        if self.memory_cache is None:
+            return fetch()
+        # the memory cache hands back the same object each time, so callers get a copy
+        return self.memory_cache.get_or_fetch(key, fetch).copy()
 
-        return prices_df
+    def _rows_to_columns(self, rows: list, dtypes: dict, datetime_column: Optional[str],
+                         drop: tuple = ()) -> pd.DataFrame:
+        """Builds a pandas dataframe column by column from a list of
+        row dictionaries rather than letting pandas infer from each row
 
-    def _format_rates(self, response: dict) -> pd.DataFrame:
-        """Converts the response from a historical rates request to a pandas dataframe
+            Args:
+                rows: The list of dictionaries in the 'result' field of a response
+                dtypes: Dictionary of column name to dtype for the numeric and categorical
+                columns. Columns not in this dictionary are passed to pandas as they are
+                datetime_column: Name of the column of ISO8601 strings to parse as UTC datetimes,
+                or None if there is no column to parse
+                drop: Names of columns to leave out of the dataframe
+
+            Returns:
+                A pandas dataframe with a column for each key in the rows
+        """
+
+        columns = {}
+        for key in rows[0]:
+            if key in drop:
+                continue
+            values = [row[key] for row in rows]
+            if key == datetime_column:
+                # to_datetime has a large fixed cost, which dominates when polling for a single row
+                if len(values) == 1:
+                    timestamp = pd.Timestamp(values[0])
+                    if timestamp.tzinfo is None:
+                        timestamp = timestamp.tz_localize('UTC')
+                    values = pd.DatetimeIndex([timestamp.tz_convert('UTC')])
+                else:
+                    values = pd.to_datetime(values, utc=True, cache=True, **_ISO8601_KWARGS)
+            elif dtypes.get(key) == 'category':
+                values = pd.Categorical(values)
+            elif key in dtypes:
+                values = np.asarray(values, dtype=dtypes[key])
+            columns[key] = values
+
+        return pd.DataFrame(columns)
+
+    def _sort_by_time(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Sorts a freshly built dataframe by its 'time' column in ascending order
 
             Args:
-                response: The json data of a response object from a historical funding rates request
+                df: A pandas dataframe with a default index and a 'time' column
 
             Returns:
-                A pandas dataframe with columns for the future, time (datetime) and funding rate
+                The dataframe sorted by time with its index reset
         """
 
-        rates_dict = response['result']
-        if len(rates_dict)==0:
-            return pd.DataFrame()
+        # the candle endpoints already return rows in order so this is usually a no-op
+        if len(df) < 2 or df['time'].is_monotonic_increasing:
+            return df
+
+        # tz-aware times come back from to_numpy as an object array of Timestamps, which numpy
+        # compares in Python. Their int64 nanoseconds sort in the same order in C
+        order = np.argsort(df['time'].to_numpy('datetime64[ns]').view('i8'), kind='stable')
+        df = df.take(order)
+        # set the index directly as reset_index would copy every column again
+        df.index = pd.RangeIndex(len(df))
+        return df
 
-        rates_df = pd.DataFrame.from_dict(rates_dict).sort_values(by='time', ascending=True).reset_index(drop=True)
-        rates_df['time'] = rates_df['time'].apply(lambda x: parser.parse(x))
-        return rates_df
+    def _format(self, rows: list, dtypes: dict, datetime_column: Optional[str],
+                drop: tuple = ()) -> pd.DataFrame:
+        """Converts the result of a historical prices, rates or trades request to a pandas dataframe
 
-    def _format_trades(self, response: dict) -> pd.DataFrame:
-        """Converts the response from a historical trades request to a pandas dataframe
             Args:
-                response: The json data of a response object from a historical funding rates request
+                rows: The result of one or more historical requests
+                dtypes: Dictionary of column name to dtype, e.g. _CANDLE_DTYPES
+                datetime_column: Name of the column to parse as UTC datetimes, or None
+                drop: Names of columns to leave out of the dataframe
 
             Returns:
-                A pandas dataframe of the trade data
+                A pandas dataframe with a column for each field in the result,
+                sorted by time
         """
 
-        trades_dict = response['result']
-        if len(trades_dict)==0:
+        if len(rows)==0:
             return pd.DataFrame()
 
-        trades_df = pd.DataFrame.from_dict(trades_dict).sort_values(by='time', ascending=True).reset_index(drop=True)
-        trades_df['time'] = trades_df['time'].apply(lambda x: parser.parse(x))
-        return trades_df
+        return self._sort_by_time(self._rows_to_columns(rows, dtypes, datetime_column, drop))
 
     def _calc_returns(self, prices: pd.DataFrame) -> pd.DataFrame:
         """Adds a column for 'return' to a dataframe of
@@ -83,12 +199,201 @@ class HistDataFetcher:
                 interval to the open of the current interval
         """
 
-        prices['return'] = (prices['open']/prices['open'].shift(1)) - 1
+        # working on the underlying array avoids building a shifted copy of the column
+        opens = prices['open'].to_numpy()
+        # keeps float32 for compact prices, anything else gets float64 returns
+        returns = np.empty(len(opens), dtype=opens.dtype if opens.dtype.kind == 'f' else np.float64)
+        returns[:1] = np.nan
+        np.divide(opens[1:], opens[:-1], out=returns[1:])
+        returns[1:] -= 1
+
+        prices['return'] = returns
         return prices
 
+    @staticmethod
+    def to_datetime_index(df: pd.DataFrame, col: str = 'time', unit: str = 'ms') -> pd.DataFrame:
+        """Returns the dataframe indexed by UTC datetimes built from one of its columns
+
+            Args:
+                df: A pandas dataframe, e.g. as returned by get_future_prices
+                col: The column to build the index from. Defaults to 'time'
+                unit: The unit of col if it holds integer timestamps. Defaults to 'ms',
+                which is what FTX uses for the 'time' column of candles
+
+            Returns:
+                The dataframe with a DatetimeIndex. The column itself is kept
+        """
+
+        values = df[col]
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values.to_numpy(), unit=unit, utc=True)
+        # unnamed so that df['time'] still refers unambiguously to the column
+        return df.set_index(pd.DatetimeIndex(values, name=None), drop=False)
+
+    def log_returns(self, prices: pd.DataFrame, column: str = 'close') -> np.ndarray:
+        """Calculates the log return between consecutive rows of a prices dataframe
+
+            Args:
+                prices: A pandas dataframe of prices, as returned by get_future_prices
+                column: The price column to use. Defaults to 'close'
+
+            Returns:
+                A float64 numpy array the same length as prices where element i is
+                log(price[i] / price[i-1]). The first element is NaN
+        """
+
+        return _kernels.log_returns(prices[column].to_numpy())
+
+    def rolling_vwap(self, prices: pd.DataFrame, window: int) -> np.ndarray:
+        """Calculates the volume weighted average of the close price over
+        a rolling window of candles
+
+            Args:
+                prices: A pandas dataframe of prices, as returned by get_future_prices
+                window: The number of candles in the window
+
+            Returns:
+                A float64 numpy array the same length as prices. The first
+                window - 1 elements, and any window with no volume, are NaN
+
+            Raises:
+                ValueError: If window is less than 1
+        """
+
+        return _kernels.rolling_vwap(prices['close'].to_numpy(), prices['volume'].to_numpy(), window)
+
+    def trades_to_candles(self, trades: pd.DataFrame, bucket_seconds: int) -> pd.DataFrame:
+        """Aggregates trades into candles in a single pass over the trades
+
+            Args:
+                trades: A pandas dataframe of trades sorted by time, as returned by get_trades
+                bucket_seconds: The size of the candle in seconds
+
+            Returns:
+                A pandas dataframe with columns for startTime, open, high, low, close,
+                volume, vwap and count (the number of trades). Only intervals which
+                contain at least one trade have a row
+        """
+
+        columns = ['startTime', 'open', 'high', 'low', 'close', 'volume', 'vwap', 'count']
+        if trades.empty:
+            return pd.DataFrame(columns=columns)
+
+        ts_ns = trades['time'].to_numpy(dtype='datetime64[ns]').view('int64')
+        price = np.ascontiguousarray(trades['price'].to_numpy(), dtype=np.float64)
+        size = np.ascontiguousarray(trades['size'].to_numpy(), dtype=np.float64)
+
+        # there can be at most one candle per trade
+        max_candles = len(trades)
+        start = np.empty(max_candles, dtype=np.int64)
+        open_, high, low, close, volume, notional = (np.empty(max_candles) for _ in range(6))
+        count = np.empty(max_candles, dtype=np.int64)
+
+        n = _kernels.bucket_trades(ts_ns, price, size, bucket_seconds * 1_000_000_000,
+                                   start, open_, high, low, close, volume, notional, count)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = notional[:n] / volume[:n]
+
+        return pd.DataFrame({
+            'startTime': pd.to_datetime(start[:n], unit='ns', utc=True),
+            'open': open_[:n],
+            'high': high[:n],
+            'low': low[:n],
+            'close': close[:n],
+            'volume': volume[:n],
+            'vwap': vwap,
+            'count': count[:n]
+        }, columns=columns)
+
+    def _fetch_pages(self, endpoint: str, query_params: dict, start_time: float, end_time: float,
+                     key: str, earliest_time_fn: Callable[[list], float], min_gap: float) -> list:
+        """Pages backwards from the end time through a historical endpoint,
+        as FTX only returns a set number of rows per response
+
+            Args:
+                endpoint: The endpoint of the request
+                query_params: Query parameters other than start_time and end_time
+                start_time: Start of the interval of time to retrieve as a timestamp
+                end_time: End of the interval of time to retrieve as a timestamp
+                key: Field which identifies a row, used to drop the rows that are
+                returned on both sides of a page boundary
+                earliest_time_fn: Function which returns the earliest time on a page as a timestamp
+                min_gap: Stop once the earliest time is within this many seconds of the start time
+
+            Returns:
+                The rows of every page, in no particular order
+        """
+
+        auth_get_json = self.connector.auth_get_json
+        rows = {}
+        page_end_time = end_time
+
+        while True:
+            page_params = dict(query_params, start_time=start_time, end_time=page_end_time)
+            page = unwrap(auth_get_json(endpoint, page_params))
+            if len(page)==0:
+                break
+
+            for row in page:
+                rows[row[key]] = row
+
+            earliest_time = earliest_time_fn(page)
+            # second condition stops the paging if a page did not move us any further back
+            if ((earliest_time - start_time) <= min_gap) or (earliest_time >= page_end_time):
+                break
+            page_end_time = earliest_time
+
+        return list(rows.values())
+
+    def _fetch_candles(self, endpoint: str, start_time: int, end_time: int, resolution: int,
+                       include_return: bool, compact: bool, parse_dates: bool,
+                       max_workers: int = 1) -> pd.DataFrame:
+        """Fetches historical candles from FTX. See get_future_prices and get_future_prices_bulk"""
+
+        # checked here rather than left to FTX so a bad resolution does not cost a request
+        if resolution not in self._CANDLE_RESOLUTIONS:
+            raise ValueError(f"Unsupported candle resolution: {resolution}")
+
+        query_params = {'resolution': resolution}
+        # the bounds of a window are inclusive, so a window this wide holds exactly one page of candles
+        window = resolution * (self._CANDLES_PER_PAGE - 1)
+        n_windows = math.ceil((end_time - start_time) / window)
+
+        if max_workers > 1 and n_windows > 1:
+            # the page boundaries are known up front, so the pages can be requested at the same
+            # time. Each window still pages on its own in case FTX returns fewer candles than expected
+            boundaries = [start_time + i * window for i in range(n_windows)] + [end_time]
+
+            def fetch_window(bounds):
+                return self._fetch_pages(endpoint, query_params, bounds[0], bounds[1],
+                                         'time', _earliest_ms, resolution * 2)
+
+            with ThreadPoolExecutor(max_workers=min(max_workers, n_windows)) as executor:
+                pages = executor.map(fetch_window, zip(boundaries[:-1], boundaries[1:]))
+                # the candle on each boundary is returned by both of the windows either side of it
+                rows = list({row['time']: row for page in pages for row in page}.values())
+        else:
+            rows = self._fetch_pages(endpoint, query_params, start_time, end_time,
+                                     'time', _earliest_ms, resolution * 2)
+
+        dtypes = self._CANDLE_COMPACT_DTYPES if compact else self._CANDLE_DTYPES
+        # startTime is the same instant as the integer 'time' column, which is far
+        # cheaper to convert than the strings are to parse
+        formatted_prices = self._format(rows, dtypes, None, ('startTime',))
+        if parse_dates and not formatted_prices.empty:
+            start_times = pd.to_datetime(formatted_prices['time'].to_numpy(), unit='ms', utc=True)
+            formatted_prices.insert(0, 'startTime', start_times)
+
+        # returns are calculated once all of the pages are in order so none are missed at page boundaries
+        if include_return and not formatted_prices.empty:
+            formatted_prices = self._calc_returns(formatted_prices)
+        return formatted_prices
+
     def get_future_prices(self, symbol: str, start_time: int,
                               end_time: int, resolution: int = 60,
-                          include_return: bool = False) -> pd.DataFrame:
+                          include_return: bool = False, compact: bool = False,
+                          parse_dates: bool = True) -> pd.DataFrame:
         """Retrieves the historical prices (candle format) for a symbols
 
             Args:
@@ -106,43 +411,130 @@ class HistDataFetcher:
                 and the resolution is set to 60 (1 minute) this means the return from
                 11.59 am -> 12:00 pm was 5%. Defaults to false
 
+                compact: Boolean representing whether to store the open, high, low, close
+                and volume columns as float32 to halve their memory. Prices with more than
+                ~7 significant digits lose precision. Defaults to false
+
+                parse_dates: Boolean representing whether to include the startTime column
+                as UTC datetimes. If false the column is left out and rows are identified by
+                the int64 'time' column (milliseconds since the epoch), which is cheaper to
+                build and to compare. Use to_datetime_index to get datetimes on demand.
+                Defaults to true
+
             Returns:
                 A pandas dataframe of historical prices
         """
 
-        endpoint = "markets/{0}/candles".format(symbol)
-        query_params = {
+        endpoint = _candles_endpoint(symbol)
+        params = {
             'start_time': start_time,
             'end_time': end_time,
-            'resolution': resolution
+            'resolution': resolution,
+            'include_return': include_return,
+            'compact': compact,
+            'parse_dates': parse_dates
         }
-        response = self.connector.auth_get_request(endpoint, query_params).json()
-
-        if response['success']==False:
-            raise Exception(response['error'])
-
-        formatted_prices = self._format_prices(response, include_return)
-        if formatted_prices.empty:
-            return formatted_prices
-
-        earliest_time = (list(formatted_prices['time'])[0])/ 1000
-        # since the api only returns a set number of results
-        # recursively call this until we get prices back as early as the start time
-        # second condition is just so there is a definite end to the recursion (if for some reason it cannot retrieve
-        # results back that far)
-        if ((earliest_time - start_time) > (resolution * 2)) and (earliest_time != end_time):
-            formatted_prices = pd.concat([self.get_future_prices(symbol, start_time, earliest_time,
-                                                                resolution, include_return), formatted_prices])
-            formatted_prices = formatted_prices.drop_duplicates(subset=['time']). \
-                sort_values(by='time', ascending=True)
-            return formatted_prices
-        # if the earliest time is close enough to the start time then return
-        else:
-            return formatted_prices
+        return self._get_or_fetch(endpoint, params, end_time, resolution,
+                                  lambda: self._fetch_candles(endpoint, start_time, end_time, resolution,
+                                                              include_return, compact, parse_dates))
+
+    def get_future_prices_bulk(self, symbol: str, start_time: int, end_time: int,
+                               resolution: int = 60, include_return: bool = False,
+                               max_workers: int = 8, compact: bool = False,
+                               parse_dates: bool = True) -> pd.DataFrame:
+        """Retrieves the historical prices (candle format) for a symbol over a long
+        interval of time. The interval is split into windows of one response each,
+        which are requested in parallel rather than one after the other
+
+            Args:
+                symbol: The symbol of the instrument. e.g. BTC-PERP
+                start_time: Start of the interval of time to retrieve prices as timestamp
+                end_time: End of the interval of time to retrieve prices as timestamp
+                resolution: The size of the candle in seconds. Defaults to 60
+                include_return: Whether to add a 'return' column. See get_future_prices
+                max_workers: Maximum number of windows in flight at once. Keep this
+                low enough to stay inside the FTX rate limits. Defaults to 8
+                compact: Whether to store the candle columns as float32. See get_future_prices
+                parse_dates: Whether to include the startTime column. See get_future_prices
+
+            Returns:
+                A pandas dataframe of historical prices, the same as get_future_prices
+        """
+
+        endpoint = _candles_endpoint(symbol)
+        # the result is the same as get_future_prices so the two share cache entries
+        params = {
+            'start_time': start_time,
+            'end_time': end_time,
+            'resolution': resolution,
+            'include_return': include_return,
+            'compact': compact,
+            'parse_dates': parse_dates
+        }
+        return self._get_or_fetch(endpoint, params, end_time, resolution,
+                                  lambda: self._fetch_candles(endpoint, start_time, end_time, resolution,
+                                                              include_return, compact, parse_dates,
+                                                              max_workers))
+
+    async def get_future_prices_async(self, symbols: list, start_time, end_time,
+                                      resolution: int = 60, include_return: bool = False,
+                                      max_concurrency: int = 8, compact: bool = False,
+                                      parse_dates: bool = True) -> dict:
+        """Retrieves the historical prices (candle format) for several symbols
+        over the same interval of time, with up to max_concurrency symbols
+        being fetched at once
+
+            Args:
+                symbols: List of instrument symbols. e.g. ['BTC-PERP', 'ETH-PERP']
+                start_time: Start of the interval as a timestamp or datetime
+                end_time: End of the interval as a timestamp or datetime
+                resolution: The size of the candle in seconds. Defaults to 60
+                include_return: Whether to add a 'return' column. See get_future_prices
+                max_concurrency: Maximum number of symbols in flight at once. Keep this
+                low enough to stay inside the FTX rate limits. Defaults to 8
+                compact: Whether to store the candle columns as float32. See get_future_prices
+                parse_dates: Whether to include the startTime column. See get_future_prices
+
+            Returns:
+                A dictionary where each key is a symbol and the value is
+                a pandas dataframe of historical prices for that symbol
+        """
+
+        # convert the interval once rather than once per symbol
+        start_ts = _ts(start_time)
+        end_ts = _ts(end_time)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(symbol):
+            async with semaphore:
+                # the connector is blocking so each fetch runs in a worker thread
+                return await asyncio.to_thread(self.get_future_prices, symbol, start_ts, end_ts,
+                                               resolution, include_return, compact, parse_dates)
+
+        results = await asyncio.gather(*[fetch(symbol) for symbol in symbols])
+        return dict(zip(symbols, results))
+
+    def get_future_prices_many(self, symbols: list, start_time, end_time,
+                               resolution: int = 60, include_return: bool = False,
+                               max_concurrency: int = 8, compact: bool = False,
+                               parse_dates: bool = True) -> dict:
+        """Blocking wrapper around get_future_prices_async. Cannot be called
+        from inside a running event loop (e.g. a notebook cell), await
+        get_future_prices_async there instead
+
+            Returns:
+                A dictionary where each key is a symbol and the value is
+                a pandas dataframe of historical prices for that symbol
+        """
+
+        return asyncio.run(self.get_future_prices_async(symbols, start_time, end_time, resolution,
+                                                        include_return, max_concurrency, compact,
+                                                        parse_dates))
 
     def get_index_prices(self, symbol: str, start_time: int,
                               end_time: int, resolution: int = 60,
-                            include_return: bool = False) -> pd.DataFrame:
+                            include_return: bool = False, compact: bool = False,
+                            parse_dates: bool = True) -> pd.DataFrame:
         """Retrieves the historical prices (candle format) for indices
 
             Args:
@@ -161,35 +553,32 @@ class HistDataFetcher:
                 and the resolution is set to 60 (1 minute) this means the return from
                 11.59 am -> 12:00 pm was 5%. Defaults to false
 
+                compact: Boolean representing whether to store the open, high, low, close
+                and volume columns as float32 to halve their memory. Prices with more than
+                ~7 significant digits lose precision. Defaults to false
+
+                parse_dates: Boolean representing whether to include the startTime column
+                as UTC datetimes. If false the column is left out and rows are identified by
+                the int64 'time' column (milliseconds since the epoch), which is cheaper to
+                build and to compare. Use to_datetime_index to get datetimes on demand.
+                Defaults to true
+
             Returns:
                 A pandas dataframe of historical prices
         """
 
-        endpoint = "indexes/{0}/candles".format(symbol)
-        query_params = {
+        endpoint = f"indexes/{symbol}/candles"
+        params = {
             'start_time': start_time,
             'end_time': end_time,
-            'resolution': resolution
+            'resolution': resolution,
+            'include_return': include_return,
+            'compact': compact,
+            'parse_dates': parse_dates
         }
-        response = self.connector.auth_get_request(endpoint, query_params).json()
-        if response['success']==False:
-            raise Exception(response['error'])
-
-        formatted_prices = self._format_prices(response, include_return)
-        if formatted_prices.empty:
-            return formatted_prices
-
-        earliest_time = (list(formatted_prices['time'])[0])/ 1000
-        # since the api only returns a set number of results
-        # recursively call this until we get prices back as early as the start time
-        if ((earliest_time - start_time) > (resolution * 2)) & (earliest_time != end_time):
-            formatted_prices =  pd.concat([self.get_index_prices(symbol, start_time, earliest_time,
-                                                                resolution, include_return), formatted_prices])
-            formatted_prices = formatted_prices.drop_duplicates(subset = ['time']).\
-                sort_values(by = 'time', ascending = True)
-            return formatted_prices
-        else:
-            return formatted_prices
+        return self._get_or_fetch(endpoint, params, end_time, resolution,
+                                  lambda: self._fetch_candles(endpoint, start_time, end_time, resolution,
+                                                              include_return, compact, parse_dates))
 
     def get_rates(self, symbol: str, start_time: int, end_time: int) -> pd.DataFrame:
         """Retrieves the historical prices (candle format) for a symbol
@@ -210,43 +599,35 @@ class HistDataFetcher:
         """
 
         endpoint = "funding_rates"
-        query_params = {
+        params = {
             'future': symbol,
             'start_time': start_time,
             'end_time': end_time,
         }
+        # rates are hourly so the last one can change for up to an hour
+        return self._get_or_fetch(endpoint, params, end_time, 60*60,
+                                  lambda: self._fetch_rates(symbol, start_time, end_time))
 
-        response = self.connector.auth_get_request(endpoint, query_params).json()
-
-        if response['success']==False:
-            raise Exception(response['error'])
+    def _fetch_rates(self, symbol: str, start_time: int, end_time: int) -> pd.DataFrame:
+        """Fetches the historical funding rates for a future from FTX. See get_rates"""
 
-        formatted_rates = self._format_rates(response)
-
-        if formatted_rates.empty:
-            return formatted_rates
-
-        earliest_time = list(formatted_rates['time'])[0].timestamp()
-        # since the api only returns a set number of results
-        # recursively call this until we get prices back as early as the start time
-        if ((earliest_time - start_time) > (60*60)) & (earliest_time != end_time):
-            formatted_rates = pd.concat([self.get_rates(symbol, start_time, earliest_time), formatted_rates])
-            formatted_rates = formatted_rates.drop_duplicates(subset=['time']). \
-                sort_values(by='time', ascending=True)
-            return formatted_rates
-        else:
-            return formatted_rates
+        rows = self._fetch_pages("funding_rates", {'future': symbol}, start_time, end_time,
+                                 'time', _earliest_iso, 60*60)
+        return self._format(rows, self._RATE_DTYPES, 'time')
 
-    def get_trades(self, symbol: str, start_time: int, end_time: int) -> pd.DataFrame:
+    def get_trades(self, symbol: str, start_time: int, end_time: int, compact: bool = False) -> pd.DataFrame:
         """Retrieves the historical trades for a given symbol
-        This endpoint does not guarantee it will retrieve results for the
-        full timeframe as FTX only returns a set number of results in
-        its response.
+
+        FTX only returns a set number of trades per response, so this pages
+        backwards from the end time until the start time is reached and
+        formats all of the pages at once.
 
             Args:
                 symbol: The symbol of the instrument. e.g. BTC-PERP
                 start_time: Start of the interval of time to retrieve trades as timestamp
                 end_time: End of the interval of time to retrieve trades as timestamp
+                compact: Whether to store price and size as float32 and side
+                as a categorical column. Defaults to false
 
             Returns:
                 A pandas dataframe with columns for the trade id,
@@ -254,27 +635,34 @@ class HistDataFetcher:
                 a liquidation order), and time
         """
 
-        endpoint = "/markets/{0}/trades".format(symbol)
-        query_params = {
-            'market_name': symbol,
+        endpoint = f"/markets/{symbol}/trades"
+        params = {
             'start_time': start_time,
-            'end_time': end_time
+            'end_time': end_time,
+            'compact': compact
         }
+        return self._get_or_fetch(endpoint, params, end_time, 60,
+                                  lambda: self._fetch_trades(symbol, start_time, end_time, compact))
 
-        response = self.connector.auth_get_request(endpoint, query_params).json()
+    def _fetch_trades(self, symbol: str, start_time: int, end_time: int, compact: bool) -> pd.DataFrame:
+        """Pages through the historical trades for a symbol from FTX. See get_trades"""
 
-        if response['success']==False:
-            raise Exception(response['error'])
+        endpoint = f"/markets/{symbol}/trades"
+        # keyed on trade id since several trades can share a time
+        rows = self._fetch_pages(endpoint, {'market_name': symbol}, start_time, end_time,
+                                 'id', _earliest_iso, 0)
 
-        formatted_trades =  self._format_trades(response)
-        return formatted_trades
+        dtypes = self._TRADE_COMPACT_DTYPES if compact else self._TRADE_DTYPES
+        return self._format(rows, dtypes, 'time')
 
 class LiveDataFetcher:
 
+    __slots__ = ('connector',)
+
     def __init__(self, Connector: type[Connector]):
         self.connector = Connector
 
-    def get_order_book(self, symbol: str, depth: int = 20) -> dict:
+    def get_order_book(self, symbol: str, depth: int = 20, legacy: bool = False) -> dict:
         """Returns the order book for the given symbol
 
             Args:
@@ -284,26 +672,32 @@ class LiveDataFetcher:
                 depth: How many levels of the bid/offer
                 to retrieve. Defaults to 20, max value is 100
 
+                legacy: If true each side is returned as a list of
+                dictionaries with keys 'price' and 'size' instead
+                of a numpy array. Defaults to false
+
             Returns:
                  A dictionary with top level keys consisting
                  of 'bids' and 'asks'. Each of these keys
-                 contains an array of objects where each object
-                 has a key for 'price' and 'size' indicating
-                 a level. The first element in each array
+                 contains a numpy array of shape (levels, 2) where
+                 column 0 is the price and column 1 is the size
+                 of a level. The first row in each array
                  is the most competitive bid/ask
         """
 
-        endpoint = "/markets/{0}/orderbook".format(symbol)
+        endpoint = f"/markets/{symbol}/orderbook"
         query_params = {
             'depth': depth
         }
 
-        response = self.connector.auth_get_request(endpoint, query_params).json()
-
-        if response['success'] == False:
-            raise Exception(response['error'])
+        result = unwrap(self.connector.auth_get_json(endpoint, query_params))
 
         order_book = {}
-        order_book['bids'] = list(map(lambda x: {'price': x[0], 'size': x[1]}, response['result']['bids']))
-        order_book['asks'] = list(map(lambda x: {'price': x[0], 'size': x[1]}, response['result']['asks']))
-        return order_book
\ No newline at end of file
+        if legacy:
+            order_book['bids'] = [{'price': price, 'size': size} for price, size in result['bids']]
+            order_book['asks'] = [{'price': price, 'size': size} for price, size in result['asks']]
+            return order_book
+
+        order_book['bids'] = np.asarray(result['bids'], dtype=np.float64).reshape(-1, 2)
+        order_book['asks'] = np.asarray(result['asks'], dtype=np.float64).reshape(-1, 2)
+        return order_book
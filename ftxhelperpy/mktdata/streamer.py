@@ -1,13 +1,40 @@
 import hmac
 import os
 import json
+import numpy as np
 import time
 import zlib
 
-from bisect import bisect
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from queue import SimpleQueue
+from sortedcontainers import SortedKeyList
 from threading import Thread
+from typing import Callable, Optional
 from websocket import WebSocketApp
 
+try:
+    # orjson is optional but decodes the order book updates several times faster
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+def _bid_key(level: list) -> float:
+    """Sort key which keeps bids in descending order of price"""
+
+    return -level[0]
+
+# asks are kept in ascending order of price
+_ask_key = itemgetter(0)
+
+@lru_cache(maxsize=65536)
+def _level_fragment(price: float, size: float) -> str:
+    """Returns the price:size fragment of the checksum string for a level.
+    Most levels are unchanged between checksums, so the float formatting is cached"""
+
+    return f"{price}:{size}"
+
 class Streamer:
 
     _SOCKET_URL = "wss://ftx.com/ws/"
@@ -108,7 +135,7 @@ class Streamer:
         variables to be set
         """
 
-        ts = int(time.time() * 1000)
+        ts = time.time_ns() // 1_000_000
         self.send({
             'op': 'login',
             'args': {
@@ -139,11 +166,71 @@ class Streamer:
             self._init_connect()
             self._login()
 
+class StreamerHub(Streamer):
+    """A single websocket connection which several streams can share,
+    rather than each opening its own socket and thread. Messages are
+    decoded once and passed to the handler registered for their channel
+    and market"""
+
+    def __init__(self):
+        super().__init__()
+        # dictionary where each key is a (channel, market) pair and value is the function handling
+        # its messages. A market of None means every market on the channel without its own handler
+        self.handlers = {}
+
+    def register(self, channel: str, handler: Callable[[dict], None], market: Optional[str] = None) -> None:
+        """Routes the messages for a channel (or one market on a channel) to a handler
+
+        Parameters:
+            channel: The FTX channel e.g. 'orderbook'
+            handler: Function which is passed each decoded message
+            for the channel
+            market: The market e.g. 'BTC-PERP', or None for every market
+            on the channel which does not have a handler of its own
+
+        Raises:
+            ValueError: If a different handler is already registered for
+            the channel and market, as only one of them could receive the messages
+        """
+
+        key = (channel, market)
+        registered = self.handlers.get(key)
+        if registered is not None and registered != handler:
+            raise ValueError("A handler is already registered for channel {0} and market {1}".format(channel, market))
+        self.handlers[key] = handler
+
+    def unregister(self, channel: str, market: Optional[str] = None) -> None:
+        """Stops routing the messages for a channel (or one market on a channel)
+
+        Parameters:
+            channel: The FTX channel e.g. 'orderbook'
+            market: The market the handler was registered for, or None
+        """
+
+        self.handlers.pop((channel, market), None)
+
+    def _on_message(self, ws: WebSocketApp, msg) -> None:
+        msg = loads(msg)
+        channel = msg.get('channel')
+        handler = self.handlers.get((channel, msg.get('market')))
+        if handler is None:
+            handler = self.handlers.get((channel, None))
+        # messages without a channel (e.g. pong) or for a channel nobody registered are dropped
+        if handler is not None:
+            handler(msg)
+
 class OrderBookStream(Streamer):
 
     _ORDER_DEPTH_CHECKSUM = 100
-    def __init__(self):
+    _CHANNEL = 'orderbook'
+    # the checksum is validated after this many updates or this long since the last check,
+    # whichever comes first, rather than after every update
+    _CHECKSUM_EVERY_UPDATES = 32
+    _CHECKSUM_INTERVAL_SECS = 0.05
+    def __init__(self, hub: Optional[StreamerHub] = None):
         super().__init__()
+        # if set, the order book is streamed over the hub's connection instead of its own
+        self.hub = hub
         # dictionary where each key is a market and value is the order book
         self.order_book = {}
         self._subscribed_list = []
@@ -151,12 +238,72 @@ class OrderBookStream(Streamer):
         self.update_times = {}
         # checksums to ensure our current state is correct
         self.market_checksums = {}
-        # keeping a pointer to position of each level
-        self.market_level_pointers = {}
+        # for each market and side, a dictionary of price to the [price, size]
+        # level in the order book so that sizes can be updated without a search
+        self.market_levels = {}
         # dictionary storing whether the last checksum check was valid
         self.valid_checksums = {}
+        # for each market, the number of updates since the checksum was last validated
+        self.updates_since_checksum = {}
         # stores tickers which we want to resubscribe to
         self.resubscribe_requests = {}
+        # messages waiting to be handled, so the socket thread only has to receive.
+        # They are raw strings from our own socket or dictionaries from a hub
+        self._messages = SimpleQueue()
+        # the thread which decodes the messages and updates the order book
+        self.consumer_thread = None
+
+    def connect(self):
+        if self.hub is None:
+            super().connect()
+            return
+
+        # each market is registered with the hub as it is subscribed to, so several
+        # streams can share the hub without receiving each other's markets
+        self._start_consumer()
+        self.hub.connect()
+
+    def send(self, msg: dict) -> None:
+        """Sends a message to the server, over the hub's
+        connection if there is one
+
+        Parameters:
+           msg: dictionary for the message we want
+           to send to server
+        """
+
+        if self.hub is None:
+            super().send(msg)
+        else:
+            self.hub.send(msg)
+
+    def _init_connect(self):
+        """Starts the thread which handles messages and then
+        establishes initial connection to FTX server"""
+
+        self._start_consumer()
+        super()._init_connect()
+
+    def _start_consumer(self):
+        """Starts the thread which handles the queued messages"""
+
+        if self.consumer_thread is None:
+            self.consumer_thread = Thread(target = self._consume_messages)
+            self.consumer_thread.daemon = True
+            self.consumer_thread.start()
+
+    def _consume_messages(self):
+        """Decodes and handles the queued messages in the order they arrived"""
+
+        while True:
+            msg = self._messages.get()
+            try:
+                if not isinstance(msg, dict):
+                    msg = loads(msg)
+                self._handle_message(msg)
+            except Exception as err:
+                # carry on with the next message, as the socket does after an error in a callback
+                print("Error occurred handling message in {0}: {1}".format(self.__class__.__name__, err))
 
     def _handle_partial(self, msg: dict):
         """Handles a partial (i.e. full state) message
@@ -168,24 +315,18 @@ class OrderBookStream(Streamer):
         ticker = msg['market']
         self.update_times[ticker] = msg['data']['time']
         self.market_checksums[ticker] = msg['data']['checksum']
-        self.order_book[ticker] = {
-            'bids': msg['data']['bids'],
-            'asks': msg['data']['asks']
-        }
-
-        # this is an expensive op but it is only carried out once
-        # per market when the initial state is received
-        self.market_level_pointers[ticker] = {'bids': {}, 'asks': {}}
         bids = msg['data']['bids']
         asks = msg['data']['asks']
-
-        for i in range(len(bids)):
-            price = bids[i][0]
-            self.market_level_pointers[ticker]['bids'][price] = i
-
-        for i in range(len(asks)):
-            price = asks[i][0]
-            self.market_level_pointers[ticker]['asks'][price] = i
+        # the sorted lists keep the most competitive level at the front
+        self.order_book[ticker] = {
+            'bids': SortedKeyList(bids, key=_bid_key),
+            'asks': SortedKeyList(asks, key=_ask_key)
+        }
+        # the levels are shared with the order book so updating a size updates both
+        self.market_levels[ticker] = {
+            'bids': {level[0]: level for level in bids},
+            'asks': {level[0]: level for level in asks}
+        }
 
         self.validate_checksum(ticker)
 
@@ -195,21 +336,24 @@ class OrderBookStream(Streamer):
         https://docs.ftx.com/#orderbooks for more details
         """
 
-        raw_str = ""
+        # iterating is cheaper than indexing into the sorted lists level by level
+        bids = list(islice(bids, self._ORDER_DEPTH_CHECKSUM))
+        asks = list(islice(asks, self._ORDER_DEPTH_CHECKSUM))
 
-        for i in range(self._ORDER_DEPTH_CHECKSUM):
+        parts = []
+        append = parts.append
+        # both sides have a level for the first min(len(bids), len(asks)) levels
+        for bid, ask in zip(bids, asks):
+            append(_level_fragment(bid[0], bid[1]))
+            append(_level_fragment(ask[0], ask[1]))
 
-            if i < len(bids):
-                raw_str += "{0}:{1}:".format(bids[i][0], bids[i][1])
+        # then whichever side is deeper carries on alone
+        common = min(len(bids), len(asks))
+        for level in (bids if len(bids) > common else asks)[common:]:
+            append(_level_fragment(level[0], level[1]))
 
-            if i < len(asks):
-                raw_str += "{0}:{1}:".format(asks[i][0], asks[i][1])
-
-        # remove trailing colon if it exists
-        if raw_str[-1] == ":":
-            raw_str = raw_str[:-1]
-
-        return raw_str
+        # joining once avoids building a new string for every level
+        return ":".join(parts)
 
     def validate_checksum(self, ticker: str) -> bool:
         """Checks if the checksum checks out (i.e. that
@@ -228,7 +372,7 @@ class OrderBookStream(Streamer):
         raw_string = self.generate_raw_checksum_string(self.order_book[ticker]['bids'],
                                                   self.order_book[ticker]['asks'])
 
-        our_checksum = zlib.crc32(str.encode(raw_string))
+        our_checksum = zlib.crc32(raw_string.encode('ascii'))
 
         is_correct = (our_checksum == self.market_checksums[ticker])
         self.valid_checksums[ticker] = {'is_correct': is_correct, 'updated_at': time.time()}
@@ -252,8 +396,12 @@ class OrderBookStream(Streamer):
         self.update_times.pop(ticker, None)
         self.market_checksums.pop(ticker, None)
         self.order_book.pop(ticker, None)
-        self.market_level_pointers.pop(ticker, None)
+        self.market_levels.pop(ticker, None)
         self.valid_checksums.pop(ticker, None)
+        self.updates_since_checksum.pop(ticker, None)
+        # free the market up for other streams on the hub. Resubscribing registers it again
+        if self.hub is not None:
+            self.hub.unregister(self._CHANNEL, ticker)
 
         # if we wanted to resubscribe then do that here
         if ticker in self.resubscribe_requests:
@@ -271,13 +419,15 @@ class OrderBookStream(Streamer):
             size at that prices
         """
 
+        levels = self.market_levels[ticker][side]
+
         for update in updates:
             price = update[0]
             size = update[1]
 
-            if price in self.market_level_pointers[ticker][side]:
+            if price in levels:
                 self._handle_update_to_existing_level(ticker, side, price, size)
-            else:
+            elif size > 0:
                 self._handle_new_level(ticker, side, price, size)
 
     def get_level(self, ticker: str, side: str, level: int) -> list:
@@ -292,23 +442,21 @@ class OrderBookStream(Streamer):
 
         return self.order_book[ticker][side][level]
 
-    def _get_insert_index(self, side: str, existing_prices: list[float], price: float) -> int:
-        """Returns the index at which we should insert this price
+    def get_side_array(self, ticker: str, side: str) -> np.ndarray:
+        """Returns a copy of one side of the order book for this ticker as
+        a numpy array, for vectorised calculations over the levels
 
         Parameters:
-            side: String whichis either bids/asks
-            existing_prices: list of current prices
-            price: New price for insert
+            ticker: String representing the ticker
+            side: Either 'bids' or 'asks'
+
         Returns:
-            int for the index we should insert this price at
+            A float64 numpy array of shape (levels, 2) where column 0 is
+            the price and column 1 is the size of a level. The first row
+            is the most competitive level, the same as LiveDataFetcher.get_order_book
         """
 
-        if side == 'asks':
-            # if it is ask then it is sorted
-            return bisect(existing_prices, price)
-        else:
-            # need to bisect on the reversed list since bids are sorted descending
-            return len(existing_prices) - bisect(list(reversed(existing_prices)), price)
+        return np.array(self.order_book[ticker][side], dtype=np.float64).reshape(-1, 2)
 
     def _handle_new_level(self, ticker: str, side: str, price: float, size: float):
         """Handles update which includes a new level on this side
@@ -320,20 +468,10 @@ class OrderBookStream(Streamer):
             size: The size at the new level
         """
 
-        existing_levels = self.order_book[ticker][side]
-        # get array of prices for this side
-        existing_prices = list(map(lambda x: x[0], existing_levels))
-        # find the correct insert index for this price
-        insert_index = self._get_insert_index(side, existing_prices, price)
-        # insert a new level at this index on this side of the book
-        self.order_book[ticker][side].insert(insert_index, [price, size])
-        # now bump the pointer for all levels after this level
-        self.market_level_pointers[ticker][side][price] = insert_index
-
-        for i in range(insert_index + 1, len(self.order_book[ticker][side])):
-            price_at_level = self.order_book[ticker][side][i][0]
-            # these have all been moved back one
-            self.market_level_pointers[ticker][side][price_at_level] += 1
+        level = [price, size]
+        # the sorted list finds the position in O(log n)
+        self.order_book[ticker][side].add(level)
+        self.market_levels[ticker][side][price] = level
 
     def _handle_update_to_existing_level(self, ticker: str, side: str, price: float, size: float):
         """Handles an update in the order book to a level
@@ -348,21 +486,11 @@ class OrderBookStream(Streamer):
 
         if size <= 0:
             # order at this level is now non-existent
-            # find where this level is in the book
-            previous_index = self.market_level_pointers[ticker][side][price]
-            # delete the level
-            del self.order_book[ticker][side][previous_index]
-            # pointers now need to be updated for everything that was after this level
-            # as they have now been shifted down 1
-            for i in range(previous_index, len(self.order_book[ticker][side])):
-                price_at_level = self.order_book[ticker][side][i][0]
-                self.market_level_pointers[ticker][side][price_at_level] -= 1
-
-            del self.market_level_pointers[ticker][side][price]
+            level = self.market_levels[ticker][side].pop(price)
+            self.order_book[ticker][side].remove(level)
         else:
-            # if it is an existing level on this side then the size just needs to be updated
-            # update the level at the index corresponding to this price to have the new size
-            self.order_book[ticker][side][self.market_level_pointers[ticker][side][price]][1] = size
+            # the price does not change so the level stays where it is in the book
+            self.market_levels[ticker][side][price][1] = size
 
     def _handle_update(self, msg: dict):
         """Handler for update messages"""
@@ -375,8 +503,29 @@ class OrderBookStream(Streamer):
         self.update_times[ticker] = msg['data']['time']
         self.market_checksums[ticker] = msg['data']['checksum']
 
+        updates = self.updates_since_checksum.get(ticker, 0) + 1
+        last_checked = self.valid_checksums[ticker]['updated_at']
+        if updates < self._CHECKSUM_EVERY_UPDATES and time.time() - last_checked < self._CHECKSUM_INTERVAL_SECS:
+            self.updates_since_checksum[ticker] = updates
+            return
+
+        self.updates_since_checksum[ticker] = 0
+        # our copy of the book has drifted from FTX's so start again from a fresh partial
+        if not self.validate_checksum(ticker) and ticker not in self.resubscribe_requests:
+            self.resubscribe_ticker(ticker)
+
     def _on_message(self, ws, msg):
-        msg = json.loads(msg)
+        # decoding and updating the book happen on the consumer thread
+        # so that a burst of updates does not hold up the socket
+        self._messages.put(msg)
+
+    def _handle_message(self, msg: dict):
+        """Passes a decoded message to the handler for its type
+
+        Parameters:
+            msg: Dictionary representing the message
+        """
+
         if msg['type'] == 'partial':
             self._handle_partial(msg)
         elif msg['type'] == 'update':
@@ -394,7 +543,7 @@ class OrderBookStream(Streamer):
             we want to unsubscribe
         """
 
-        self._unsubscribe({'channel': 'orderbook', 'market': ticker})
+        self._unsubscribe({'channel': self._CHANNEL, 'market': ticker})
 
     def resubscribe_ticker(self, ticker: str):
         """Unsubscribes and then resubscribes to a ticker"""
@@ -405,11 +554,15 @@ class OrderBookStream(Streamer):
 
     def subscribe_ticker(self, ticker: str):
         if ticker in self._subscribed_list:
-            print("Already subscribed to {0}",format(ticker))
+            print("Already subscribed to {0}".format(ticker))
             return
 
+        if self.hub is not None:
+            # the hub has already decoded the messages so they go straight on the queue
+            self.hub.register(self._CHANNEL, self._messages.put, ticker)
+
         print("Subscribing to orderbook for {0}".format(ticker))
-        self._subscribe({'channel': 'orderbook', 'market': ticker})
+        self._subscribe({'channel': self._CHANNEL, 'market': ticker})
 
     def is_subscribed(self, ticker: str) -> bool:
         """Checks if we have subscribed to the given ticker
@@ -0,0 +1,39 @@
+import atexit
+
+from functools import lru_cache
+from requests import RequestException
+from threading import Event, Thread
+
+from ftxhelperpy.utils.connect import Connector
+
+# idle connections are dropped by the server after 30-60s, so they are used more often than that
+_KEEP_ALIVE_SECS = 10
+
+def _keep_alive(connector: Connector, stopped: Event) -> None:
+    """Sends a cheap request every _KEEP_ALIVE_SECS until stopped is set, so the
+    pooled connection is not closed while a slow test (or test module) is running"""
+
+    while not stopped.wait(_KEEP_ALIVE_SECS):
+        try:
+            connector.session.get(connector.api_endpoint + '/markets/BTC-PERP', timeout=5)
+        except RequestException as e:
+            # the next request opens a new connection anyway, so a failed ping is not fatal
+            print(f'Keep alive request failed: {e}')
+
+@lru_cache(maxsize=1)
+def shared_connector() -> Connector:
+    """Returns the Connector shared by every mktdata test class, so they
+    all send their requests through one pool of connections"""
+
+    connector = Connector()
+    # open a pooled connection up front so the first test does not also time the TLS handshake
+    connector.session.get(connector.api_endpoint + '/markets/BTC-PERP', timeout=5)
+
+    stopped = Event()
+    Thread(target=_keep_alive, args=(connector, stopped), daemon=True).start()
+    # closed when the run finishes rather than by the first test class to finish. atexit runs
+    # these last in first, so the pings stop before the session's cookies are cleared.
+    # The pooled connections are shared with every other Connector and are left open
+    atexit.register(connector.close)
+    atexit.register(stopped.set)
+    return connector
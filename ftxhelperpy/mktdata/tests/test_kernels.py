@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import unittest
+
+from ftxhelperpy.mktdata import _kernels
+from ftxhelperpy.mktdata.prices import HistDataFetcher
+
+class TestKernelMethods(unittest.TestCase):
+
+    def test_log_returns(self):
+        close = np.array([100.0, 110.0, 99.0, 99.0])
+        returns = _kernels.log_returns(close)
+
+        self.assertTrue(np.isnan(returns[0]))
+        np.testing.assert_allclose(returns[1:], np.log(close[1:] / close[:-1]))
+
+    def test_log_returns_float32(self):
+        close = np.array([100.0, 110.0], dtype=np.float32)
+        returns = _kernels.log_returns(close)
+
+        self.assertEqual(returns.dtype, np.float64)
+        self.assertAlmostEqual(returns[1], np.log(1.1), places=6)
+
+    def test_log_returns_read_only(self):
+        close = np.array([100.0, 110.0])
+        close.flags.writeable = False
+        returns = _kernels.log_returns(close)
+
+        self.assertAlmostEqual(returns[1], np.log(1.1))
+
+    def test_rolling_vwap(self):
+        price = np.array([1.0, 2.0, 3.0, 4.0])
+        volume = np.array([1.0, 1.0, 2.0, 0.0])
+        vwap = _kernels.rolling_vwap(price, volume, 2)
+
+        self.assertTrue(np.isnan(vwap[0]))
+        np.testing.assert_allclose(vwap[1:], [1.5, 8.0 / 3.0, 3.0])
+
+    def test_rolling_vwap_no_volume_is_nan(self):
+        price = np.array([1.0, 2.0, 3.0])
+        volume = np.array([1.0, 0.0, 0.0])
+        vwap = _kernels.rolling_vwap(price, volume, 2)
+
+        self.assertTrue(np.isnan(vwap[2]))
+
+    def test_rolling_vwap_invalid_window_raises_exception(self):
+        price = np.array([1.0, 2.0])
+        volume = np.array([1.0, 1.0])
+
+        for window in (0, -1):
+            with self.assertRaises(ValueError):
+                _kernels.rolling_vwap(price, volume, window)
+
+    def test_bucket_trades(self):
+        second = 1_000_000_000
+        ts_ns = np.array([0, 10, 59, 61, 200], dtype=np.int64) * second
+        price = np.array([1.0, 3.0, 2.0, 5.0, 4.0])
+        size = np.array([1.0, 1.0, 2.0, 1.0, 1.0])
+
+        outputs = [np.empty(5, dtype=np.int64)] + [np.empty(5) for _ in range(6)] + [np.empty(5, dtype=np.int64)]
+        start, open_, high, low, close, volume, notional, count = outputs
+        n = _kernels.bucket_trades(ts_ns, price, size, 60 * second, *outputs)
+
+        self.assertEqual(n, 3)
+        np.testing.assert_array_equal(start[:n], np.array([0, 60, 180]) * second)
+        np.testing.assert_array_equal(open_[:n], [1.0, 5.0, 4.0])
+        np.testing.assert_array_equal(high[:n], [3.0, 5.0, 4.0])
+        np.testing.assert_array_equal(low[:n], [1.0, 5.0, 4.0])
+        np.testing.assert_array_equal(close[:n], [2.0, 5.0, 4.0])
+        np.testing.assert_array_equal(volume[:n], [4.0, 1.0, 1.0])
+        np.testing.assert_array_equal(notional[:n], [8.0, 5.0, 4.0])
+        np.testing.assert_array_equal(count[:n], [3, 1, 1])
+
+class TestHistDataFetcherKernelMethods(unittest.TestCase):
+    # the kernels are called on dataframe columns, which pandas may hand back as read only arrays
+
+    def setUp(self) -> None:
+        # none of these methods make requests, so no connector is needed
+        self.data_fetcher = HistDataFetcher(None)
+        self.prices = pd.DataFrame({'close': [100.0, 110.0, 99.0, 99.0, 101.0],
+                                    'volume': [1.0, 1.0, 2.0, 0.0, 1.0]})
+
+    def test_log_returns(self):
+        returns = self.data_fetcher.log_returns(self.prices)
+
+        close = self.prices['close'].to_numpy()
+        self.assertTrue(np.isnan(returns[0]))
+        np.testing.assert_allclose(returns[1:], np.log(close[1:] / close[:-1]))
+
+    def test_log_returns_float32(self):
+        returns = self.data_fetcher.log_returns(self.prices.astype(np.float32))
+
+        self.assertEqual(returns.dtype, np.float64)
+        self.assertAlmostEqual(returns[1], np.log(1.1), places=6)
+
+    def test_rolling_vwap(self):
+        vwap = self.data_fetcher.rolling_vwap(self.prices, 2)
+
+        self.assertTrue(np.isnan(vwap[0]))
+        np.testing.assert_allclose(vwap[1:], [105.0, 308.0 / 3.0, 99.0, 101.0])
+
+    def test_trades_to_candles(self):
+        trades = pd.DataFrame({
+            'price': [1.0, 3.0, 2.0, 5.0],
+            'size': [1.0, 1.0, 2.0, 1.0],
+            'time': pd.to_datetime(['2021-01-01 00:00:00', '2021-01-01 00:00:10',
+                                    '2021-01-01 00:00:59', '2021-01-01 00:02:01'], utc=True)
+        })
+        candles = self.data_fetcher.trades_to_candles(trades, 60)
+
+        self.assertEqual(list(candles['startTime']),
+                         list(pd.to_datetime(['2021-01-01 00:00:00', '2021-01-01 00:02:00'], utc=True)))
+        self.assertEqual(list(candles['open']), [1.0, 5.0])
+        self.assertEqual(list(candles['high']), [3.0, 5.0])
+        self.assertEqual(list(candles['close']), [2.0, 5.0])
+        self.assertEqual(list(candles['vwap']), [2.0, 5.0])
+        self.assertEqual(list(candles['count']), [3, 1])
+
+if __name__ == '__main__':
+    unittest.main()
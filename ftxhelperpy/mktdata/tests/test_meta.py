@@ -3,14 +3,13 @@ import pandas as pd
 import unittest
 
 from ftxhelperpy.mktdata.meta import MetaDataFetcher
-from ftxhelperpy.utils.connect import Connector
+from ftxhelperpy.mktdata.tests._shared import shared_connector
 
 class TestMetaDataFetchMethods(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls) -> None:
-        connector = Connector()
-        cls.data_fetcher = MetaDataFetcher(connector)
+        cls.data_fetcher = MetaDataFetcher(shared_connector())
 
     def setUp(self) -> None:
         self.data_fetcher = TestMetaDataFetchMethods.data_fetcher
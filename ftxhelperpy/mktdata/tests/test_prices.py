@@ -1,40 +1,82 @@
+import asyncio
 import os
+import numpy as np
 import pandas as pd
 import unittest
 
 from datetime import datetime, timedelta
 
 from ftxhelperpy.mktdata.prices import HistDataFetcher, LiveDataFetcher
-from ftxhelperpy.utils.connect import Connector
+from ftxhelperpy.mktdata.tests._shared import shared_connector
 
 class TestHistDataFetchMethods(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls) -> None:
-        connector = Connector()
-        cls.data_fetcher = HistDataFetcher(connector)
+        # FTX_TEST_CACHE=1 serves repeated identical requests from memory instead of going back to FTX
+        memory_cache_ttl = 60 if os.getenv('FTX_TEST_CACHE') == '1' else None
+        cls.data_fetcher = HistDataFetcher(shared_connector(), memory_cache_ttl=memory_cache_ttl)
+        # every test measures its dates from the same point so that identical requests have identical keys
+        cls.now = datetime.now()
+        cls.last_hour = (cls.now - timedelta(hours=1), cls.now)
+        cls.last_hour_ts = tuple(t.timestamp() for t in cls.last_hour)
+        cls.next_hour_ts = ((cls.now + timedelta(hours=1)).timestamp(), (cls.now + timedelta(hours=2)).timestamp())
 
     def setUp(self) -> None:
         self.data_fetcher = TestHistDataFetchMethods.data_fetcher
 
     def test_get_rates_correct_date_successful(self):
-        prices = self.data_fetcher.get_rates("BTC-PERP", (datetime.now()-timedelta(hours=1)).timestamp(), datetime.now().timestamp())
+        prices = self.data_fetcher.get_rates("BTC-PERP", *self.last_hour_ts)
         self.assertIsInstance(prices, pd.DataFrame)
         self.assertGreater(len(prices), 0)
 
     def test_get_index_prices_successful(self):
-        prices = self.data_fetcher.get_index_prices("BTC", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp())
+        prices = self.data_fetcher.get_index_prices("BTC", *self.last_hour_ts)
         self.assertIsInstance(prices, pd.DataFrame)
         self.assertGreater(len(prices), 0)
 
     def test_get_future_prices_successful(self):
-        prices = self.data_fetcher.get_future_prices("BTC-PERP", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp())
+        prices = self.data_fetcher.get_future_prices("BTC-PERP", *self.last_hour_ts)
         self.assertIsInstance(prices, pd.DataFrame)
         self.assertGreater(len(prices), 0)
 
+    def test_get_future_prices_without_dates_successful(self):
+        prices = self.data_fetcher.get_future_prices("BTC-PERP", *self.last_hour_ts, parse_dates=False)
+        self.assertNotIn('startTime', prices.columns)
+        self.assertEqual(prices['time'].dtype, np.int64)
+
+        indexed = self.data_fetcher.to_datetime_index(prices)
+        self.assertIsInstance(indexed.index, pd.DatetimeIndex)
+        self.assertEqual(indexed.index[0].timestamp() * 1000, prices['time'][0])
+
+    def test_get_future_prices_bulk_successful(self):
+        # four days of minute candles spans several responses
+        start_time = (self.now - timedelta(days=4)).timestamp()
+        prices = self.data_fetcher.get_future_prices_bulk("BTC-PERP", start_time, self.now.timestamp())
+        self.assertGreater(len(prices), 1500)
+        self.assertTrue(prices['time'].is_unique)
+        self.assertTrue(prices['time'].is_monotonic_increasing)
+        diff_in_secs = prices['time'][0] / 1000 - start_time
+        self.assertLess(diff_in_secs, 120)
+
+    def test_get_future_prices_many_successful(self):
+        symbols = ["BTC-PERP", "ETH-PERP"]
+        prices = self.data_fetcher.get_future_prices_many(symbols, *self.last_hour)
+        self.assertEqual(list(prices.keys()), symbols)
+        for symbol in symbols:
+            self.assertIsInstance(prices[symbol], pd.DataFrame)
+            self.assertGreater(len(prices[symbol]), 0)
+
+    def test_get_future_prices_async_successful(self):
+        symbols = ["BTC-PERP", "ETH-PERP", "SOL-PERP"]
+        prices = asyncio.run(self.data_fetcher.get_future_prices_async(symbols, *self.last_hour, max_concurrency=2))
+        self.assertEqual(list(prices.keys()), symbols)
+        for symbol in symbols:
+            self.assertGreater(len(prices[symbol]), 0)
+
     def test_get_index_prices_with_resolution_successful(self):
         resolution = 300
-        prices = self.data_fetcher.get_index_prices("BTC", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp(), resolution)
+        prices = self.data_fetcher.get_index_prices("BTC", *self.last_hour_ts, resolution)
         self.assertIsInstance(prices, pd.DataFrame)
         self.assertGreater(len(prices), 0)
         # the time difference between rows in milliseconds
@@ -43,87 +85,89 @@ class TestHistDataFetchMethods(unittest.TestCase):
 
     def test_get_index_prices_with_include_returns_true(self):
         resolution = 300
-        prices = self.data_fetcher.get_index_prices("BTC", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp(),
-                                                    resolution, include_return=True)
+        prices = self.data_fetcher.get_index_prices("BTC", *self.last_hour_ts, resolution, include_return=True)
         self.assertTrue('return' in list(prices.columns))
+        prices = prices.set_index('startTime')
 
         #pick a time and get the open at that time
-        random_time = list(prices['startTime'])[3]
-        open_at_random_time = list(prices[prices['startTime']==random_time]['open'])[0]
+        random_time = prices.index[3]
+        open_at_random_time = prices.at[random_time, 'open']
 
         #get what should be the open for the previous interval
         time_before = random_time - timedelta(seconds = resolution)
-        open_at_time_before = list(prices[prices['startTime']==time_before]['open'])[0]
+        open_at_time_before = prices.at[time_before, 'open']
 
         #calculate the return we would expect at this time
         expected_return = (open_at_random_time/open_at_time_before) - 1
 
         #get the actual return at this time
-        actual_return = list(prices[prices['startTime']==random_time]['return'])[0]
+        actual_return = prices.at[random_time, 'return']
 
         self.assertEqual(expected_return, actual_return)
 
     def test_get_future_prices_with_include_returns_true(self):
         resolution = 300
-        prices = self.data_fetcher.get_future_prices("BTC-PERP", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp(),
-                                                     resolution, include_return=True)
+        prices = self.data_fetcher.get_future_prices("BTC-PERP", *self.last_hour_ts, resolution, include_return=True)
         self.assertTrue('return' in list(prices.columns))
+        prices = prices.set_index('startTime')
 
         #pick a time and get the open at that time
-        random_time = list(prices['startTime'])[3]
-        open_at_random_time = list(prices[prices['startTime']==random_time]['open'])[0]
+        random_time = prices.index[3]
+        open_at_random_time = prices.at[random_time, 'open']
 
         #get what should be the open for the previous interval
         time_before = random_time - timedelta(seconds = resolution)
-        open_at_time_before = list(prices[prices['startTime']==time_before]['open'])[0]
+        open_at_time_before = prices.at[time_before, 'open']
 
         #calculate the return we would expect at this time
         expected_return = (open_at_random_time/open_at_time_before) - 1
 
         #get the actual return at this time
-        actual_return = list(prices[prices['startTime']==random_time]['return'])[0]
+        actual_return = prices.at[random_time, 'return']
 
         self.assertEqual(expected_return, actual_return)
 
     def test_get_index_prices_with_invalid_resolution_throws_exception(self):
         resolution = 350
         with self.assertRaises(Exception) as context:
-            self.data_fetcher.get_index_prices("BTC", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp(), resolution)
+            self.data_fetcher.get_index_prices("BTC", *self.last_hour_ts, resolution)
         self.assertTrue('Unsupported candle resolution' in str(context.exception))
 
     def test_get_index_prices_with_invalid_date_range_is_empty(self):
-        prices = self.data_fetcher.get_index_prices("BTC", (datetime.now() + timedelta(hours=1)).timestamp(), datetime.now().timestamp())
+        prices = self.data_fetcher.get_index_prices("BTC", (self.now + timedelta(hours=1)).timestamp(), self.now.timestamp())
         self.assertTrue(prices.empty)
 
     def test_get_rates_invalid_date_range_is_empty_dataframe(self):
-        rates = self.data_fetcher.get_rates("SOL-PERP", (datetime.now() + timedelta(hours=1)).timestamp(), (datetime.now() + timedelta(hours=2)).timestamp())
+        rates = self.data_fetcher.get_rates("SOL-PERP", *self.next_hour_ts)
         self.assertTrue(rates.empty)
 
     def test_get_future_prices_invalid_date_range_is_empty_dataframe(self):
-        prices = self.data_fetcher.get_future_prices("BTC-PERP", (datetime.now() + timedelta(hours=1)).timestamp(), (datetime.now() + timedelta(hours=2)).timestamp())
+        prices = self.data_fetcher.get_future_prices("BTC-PERP", *self.next_hour_ts)
         self.assertTrue(prices.empty)
 
     def test_get_future_prices_long_date_range_is_successful(self):
-        # tests the recursive call logic when the date range is long
+        # 100 days of hourly candles is more than one response, so the windows are fetched in parallel.
+        # The serial paging is covered by the index prices and rates long date range tests
         resolution = 60*60
-        start_time = (datetime.now() - timedelta(days = 100)).timestamp()
-        end_time =datetime.now().timestamp()
-        prices = self.data_fetcher.get_future_prices("BTC-PERP", start_time, end_time, resolution=resolution)
+        start_time = (self.now - timedelta(days = 100)).timestamp()
+        end_time =self.now.timestamp()
+        prices = self.data_fetcher.get_future_prices_bulk("BTC-PERP", start_time, end_time, resolution=resolution)
         diff_in_secs = (list(prices['time'])[0])/1000 - start_time
         self.assertLess(diff_in_secs, resolution * 2)
+        self.assertTrue(prices['time'].is_unique)
 
     def test_get_index_prices_long_date_range_is_successful(self):
-        # tests the recursive call logic when the date range is long
+        # tests the paging logic when the date range is long
         resolution = 60 * 60
-        start_time = (datetime.now() - timedelta(days=100)).timestamp()
-        end_time = datetime.now().timestamp()
+        start_time = (self.now - timedelta(days=100)).timestamp()
+        end_time = self.now.timestamp()
         prices = self.data_fetcher.get_index_prices("BTC", start_time, end_time, resolution=resolution)
         diff_in_secs = (list(prices['time'])[0]) / 1000 - start_time
         self.assertLess(diff_in_secs, resolution * 2)
 
     def test_get_rates_long_date_range_is_successful(self):
-        start_time = (datetime.now() - timedelta(days=100)).timestamp()
-        end_time = datetime.now().timestamp()
+        start_time = (self.now - timedelta(days=100)).timestamp()
+        end_time = self.now.timestamp()
         rates = self.data_fetcher.get_rates("BTC-PERP", start_time, end_time)
         diff_in_secs = rates['time'][0].timestamp() - start_time
         # just using 2 hours as the maximum diff as the historical rates are
@@ -132,7 +176,7 @@ class TestHistDataFetchMethods(unittest.TestCase):
 
     def test_get_future_prices_with_resolution_successful(self):
         resolution = 300
-        prices = self.data_fetcher.get_future_prices("BTC-PERP", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp(), resolution)
+        prices = self.data_fetcher.get_future_prices("BTC-PERP", *self.last_hour_ts, resolution)
 
         self.assertIsInstance(prices, pd.DataFrame)
         self.assertGreater(len(prices), 0)
@@ -141,47 +185,112 @@ class TestHistDataFetchMethods(unittest.TestCase):
         time_jumps = (prices['time'][1] - prices['time'][0])/1000
         self.assertEqual(time_jumps, resolution)
 
-    def test_historical_funding_rates_valid_args_successful(self):
-        rates = self.data_fetcher.get_rates("SOL-PERP", (datetime.now() - timedelta(hours=10)).timestamp(), datetime.now().timestamp())
-        self.assertIsInstance(rates, pd.DataFrame)
-        self.assertGreater(len(rates), 0)
-
     def test_get_trades_valid_args_is_successful(self):
-        trades = self.data_fetcher.get_trades("BTC-PERP", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp())
+        trades = self.data_fetcher.get_trades("BTC-PERP", *self.last_hour_ts)
         self.assertIsInstance(trades, pd.DataFrame)
         self.assertGreater(len(trades), 0)
 
+    def test_get_trades_long_date_range_is_successful(self):
+        # tests the paging logic when there are more trades than fit in one response
+        start_time = (self.now - timedelta(hours=3)).timestamp()
+        end_time = self.now.timestamp()
+        trades = self.data_fetcher.get_trades("BTC-PERP", start_time, end_time)
+        diff_in_secs = trades['time'][0].timestamp() - start_time
+        self.assertLess(diff_in_secs, 60)
+        self.assertTrue(trades['id'].is_unique)
+
+    def test_get_trades_compact_is_successful(self):
+        trades = self.data_fetcher.get_trades("BTC-PERP", *self.last_hour_ts, compact=True)
+        self.assertEqual(trades['price'].dtype, np.float32)
+        self.assertEqual(trades['size'].dtype, np.float32)
+        self.assertEqual(trades['side'].dtype, 'category')
+
     def test_get_trades_invalid_future_raises_exception(self):
         with self.assertRaises(Exception) as context:
-            self.data_fetcher.get_trades("AA312", (datetime.now() - timedelta(hours=1)).timestamp(), datetime.now().timestamp())
+            self.data_fetcher.get_trades("AA312", *self.last_hour_ts)
         self.assertTrue('No such market' in str(context.exception))
 
     def test_get_trades_invalid_dates_is_empty_dataframe(self):
-        trades = self.data_fetcher.get_trades("BTC-PERP", (datetime.now() + timedelta(hours=1)).timestamp(), (datetime.now()+timedelta(hours=2)).timestamp())
+        trades = self.data_fetcher.get_trades("BTC-PERP", *self.next_hour_ts)
         self.assertTrue(trades.empty)
 
     def test_get_future_prices_invalid_resolution_raises_exception(self):
         resolution = 350
         with self.assertRaises(Exception) as context:
-            self.data_fetcher.get_future_prices("BTC-PERP", (datetime.now() - timedelta(hours=1)).timestamp(),  datetime.now().timestamp(), resolution)
+            self.data_fetcher.get_future_prices("BTC-PERP", *self.last_hour_ts, resolution)
         self.assertTrue('Unsupported candle resolution' in str(context.exception))
 
     def test_get_prices_invalid_symbol_raises_exception(self):
         with self.assertRaises(Exception) as context:
-            self.data_fetcher.get_future_prices("AA321", (datetime.now() + timedelta(hours=1)).timestamp(), (datetime.now() + timedelta(hours=2)).timestamp())
+            self.data_fetcher.get_future_prices("AA321", *self.next_hour_ts)
         self.assertTrue('No such market' in str(context.exception))
 
     def test_get_rates_invalid_symbol_raises_exception(self):
         with self.assertRaises(Exception) as context:
-            self.data_fetcher.get_rates("ACBX99", (datetime.now() - timedelta(hours=10)).timestamp(), datetime.now().timestamp())
+            self.data_fetcher.get_rates("ACBX99", (self.now - timedelta(hours=10)).timestamp(), self.now.timestamp())
         self.assertTrue('No such future' in str(context.exception))
 
+class TestHistDataFormatting(unittest.TestCase):
+    # formats responses built here, so these run without a connection to FTX
+
+    def setUp(self) -> None:
+        self.data_fetcher = HistDataFetcher(None)
+
+    def test_format_trades_with_and_without_fractional_seconds(self):
+        # FTX leaves the fractional seconds out of a time when they are zero
+        rows = [{'id': 2, 'price': 2.0, 'size': 1.0, 'side': 'sell', 'liquidation': False,
+                 'time': '2021-01-01T00:00:01+00:00'},
+                {'id': 1, 'price': 1.0, 'size': 1.0, 'side': 'buy', 'liquidation': False,
+                 'time': '2021-01-01T00:00:00.500000+00:00'}]
+        trades = self.data_fetcher._format(rows, HistDataFetcher._TRADE_DTYPES, 'time')
+
+        self.assertEqual(list(trades['id']), [1, 2])
+        self.assertEqual(list(trades['time']), [pd.Timestamp('2021-01-01T00:00:00.5', tz='UTC'),
+                                                pd.Timestamp('2021-01-01T00:00:01', tz='UTC')])
+
+    def test_format_trades_newest_first_keeps_order_of_equal_times(self):
+        # FTX returns trades newest first, and trades in the same instant share a time
+        rows = [{'id': i, 'price': 1.0, 'size': 1.0, 'side': 'buy', 'liquidation': False,
+                 'time': f'2021-01-01T00:00:0{2 - i // 2}+00:00'} for i in range(6)]
+        trades = self.data_fetcher._format(rows, HistDataFetcher._TRADE_DTYPES, 'time')
+
+        self.assertEqual(list(trades['id']), [4, 5, 2, 3, 0, 1])
+        self.assertTrue(trades['time'].is_monotonic_increasing)
+        self.assertEqual(list(trades.index), list(range(6)))
+
+class _FakeCandleConnector:
+    # answers candle requests like FTX does: the latest 1500 candles between the inclusive bounds
+
+    def auth_get_json(self, endpoint, params):
+        resolution = params['resolution']
+        first = -(-int(params['start_time']) // resolution) * resolution
+        times = range(first, int(params['end_time']) + 1, resolution)[-1500:]
+        return {'success': True, 'result': [{'startTime': pd.Timestamp(t, unit='s', tz='UTC').isoformat(),
+                                             'time': t * 1000.0, 'open': float(t), 'high': float(t),
+                                             'low': float(t), 'close': float(t), 'volume': 1.0}
+                                            for t in times]}
+
+class TestHistDataPaging(unittest.TestCase):
+    # pages through a fake connector, so these run without a connection to FTX
+
+    def setUp(self) -> None:
+        self.data_fetcher = HistDataFetcher(_FakeCandleConnector())
+        self.start_time = 1609459200
+        self.end_time = self.start_time + 9999 * 60
+
+    def test_get_future_prices_bulk_matches_get_future_prices(self):
+        prices = self.data_fetcher.get_future_prices("BTC-PERP", self.start_time, self.end_time)
+        bulk_prices = self.data_fetcher.get_future_prices_bulk("BTC-PERP", self.start_time, self.end_time)
+
+        self.assertEqual(len(prices), 10000)
+        self.assertEqual(prices['time'].iloc[0], self.start_time * 1000)
+        pd.testing.assert_frame_equal(bulk_prices, prices)
+
 class TestLiveDataFetchMethods(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls) -> None:
-        connector = Connector()
-        cls.data_fetcher = LiveDataFetcher(connector)
+        cls.data_fetcher = LiveDataFetcher(shared_connector())
 
     def setUp(self) -> None:
         self.data_fetcher = TestLiveDataFetchMethods.data_fetcher
@@ -192,6 +301,22 @@ class TestLiveDataFetchMethods(unittest.TestCase):
         self.assertTrue('bids' in order_book)
         self.assertTrue('asks' in order_book)
 
+        self.assertIsInstance(order_book['bids'], np.ndarray)
+        self.assertIsInstance(order_book['asks'], np.ndarray)
+
+        # each level is a row of [price, size]
+        self.assertEqual(order_book['bids'].shape[1], 2)
+        self.assertEqual(order_book['asks'].shape[1], 2)
+
+        # best bid should be below the best ask
+        self.assertLess(order_book['bids'][0, 0], order_book['asks'][0, 0])
+
+    def test_get_order_book_legacy_successful(self):
+        order_book = self.data_fetcher.get_order_book("BTC-PERP", legacy=True)
+
+        self.assertTrue('bids' in order_book)
+        self.assertTrue('asks' in order_book)
+
         self.assertTrue(type(order_book['bids'])==list)
         self.assertTrue(type(order_book['asks']) == list)
 
@@ -1,7 +1,9 @@
+import json
 import time
 import unittest
+import zlib
 
-from ftxhelperpy.mktdata.streamer import OrderBookStream
+from ftxhelperpy.mktdata.streamer import OrderBookStream, StreamerHub
 from unittest.mock import patch
 
 class TestOrderBookStreamMethods(unittest.TestCase):
@@ -66,7 +68,7 @@ class TestOrderBookStreamMethods(unittest.TestCase):
         self.assertNotIn(TICKER, self.order_streamer.order_book)
         self.assertNotIn(TICKER, self.order_streamer.update_times)
         self.assertNotIn(TICKER, self.order_streamer.market_checksums)
-        self.assertNotIn(TICKER, self.order_streamer.market_level_pointers)
+        self.assertNotIn(TICKER, self.order_streamer.market_levels)
         self.assertNotIn(TICKER, self.order_streamer.valid_checksums)
 
     @patch.object(OrderBookStream, '_handle_update')
@@ -108,7 +110,6 @@ class TestOrderBookStreamMethods(unittest.TestCase):
 
         BID_3 = old_order_book['bids'][3]
         BID_3_PRICE = BID_3[0]
-        OLD_BID_3_INDEX = self.order_streamer.market_level_pointers[TICKER]['bids'][BID_3_PRICE]
 
         self.order_streamer._update_orders(
             TICKER,
@@ -117,11 +118,10 @@ class TestOrderBookStreamMethods(unittest.TestCase):
         )
 
         #this level should just not exist any more
-        self.assertNotIn(BID_2_PRICE, self.order_streamer.market_level_pointers[TICKER]['bids'])
+        self.assertNotIn(BID_2_PRICE, self.order_streamer.market_levels[TICKER]['bids'])
 
-        NEW_BID_3_INDEX = self.order_streamer.market_level_pointers[TICKER]['bids'][BID_3_PRICE]
         # the bid that used to exist in position 3 should now be in position 2
-        self.assertEqual(NEW_BID_3_INDEX, OLD_BID_3_INDEX - 1)
+        self.assertEqual(BID_3_PRICE, self.order_streamer.get_level(TICKER, 'bids', 2)[0])
 
     @patch.object(OrderBookStream, '_handle_update')
     def test_update_is_new_level(self, patched_handle_update):
@@ -145,9 +145,171 @@ class TestOrderBookStreamMethods(unittest.TestCase):
         )
 
         # the new bid should have been inserted at the expected index
-        self.assertEqual(NEW_BID_EXPECTED_INDEX, self.order_streamer.market_level_pointers[TICKER]['bids'][NEW_BID_PRICE])
+        self.assertEqual(NEW_BID_PRICE, self.order_streamer.get_level(TICKER, 'bids', NEW_BID_EXPECTED_INDEX)[0])
         # the bid which used to be at position 6 should now be at position 7
-        self.assertEqual(7, self.order_streamer.market_level_pointers[TICKER]['bids'][OLD_BID_6_PRICE])
+        self.assertEqual(OLD_BID_6_PRICE, self.order_streamer.get_level(TICKER, 'bids', 7)[0])
+
+class TestOrderBookChecksum(unittest.TestCase):
+
+    # does not connect, so these run without FTX_KEY1 and FTX_SECRET1
+    def setUp(self) -> None:
+        self.order_streamer = OrderBookStream()
+
+    def test_raw_checksum_string_interleaves_sides(self):
+        bids = [[5000.5, 10.0], [4995.0, 5.0], [4990.0, 1.5]]
+        asks = [[5001.0, 6.0]]
+
+        raw_string = self.order_streamer.generate_raw_checksum_string(bids, asks)
+        self.assertEqual(raw_string, "5000.5:10.0:5001.0:6.0:4995.0:5.0:4990.0:1.5")
+
+    def test_raw_checksum_string_uses_checksum_depth(self):
+        depth = self.order_streamer._ORDER_DEPTH_CHECKSUM
+        bids = [[float(1000 - i), 1.0] for i in range(depth + 10)]
+        asks = [[float(1001 + i), 1.0] for i in range(depth + 10)]
+
+        raw_string = self.order_streamer.generate_raw_checksum_string(bids, asks)
+        # each level is price:size
+        self.assertEqual(len(raw_string.split(':')), depth * 2 * 2)
+
+class TestOrderBookLevels(unittest.TestCase):
+
+    # partial messages are handled directly so these do not connect
+    def setUp(self) -> None:
+        self.order_streamer = OrderBookStream()
+        bids = [[100.0, 1.0], [99.0, 2.0], [98.0, 3.0]]
+        asks = [[101.0, 4.0], [102.0, 5.0]]
+        raw_string = self.order_streamer.generate_raw_checksum_string(bids, asks)
+        self.order_streamer._handle_partial({
+            'market': 'BTC-PERP',
+            'data': {'time': time.time(), 'checksum': zlib.crc32(raw_string.encode()), 'bids': bids, 'asks': asks}
+        })
+
+    def test_get_side_array(self):
+        self.order_streamer._update_orders('BTC-PERP', 'bids', [[99.5, 7.0], [98.0, 0]])
+
+        bids = self.order_streamer.get_side_array('BTC-PERP', 'bids')
+        self.assertEqual(bids.shape, (3, 2))
+        self.assertEqual(bids[:, 0].tolist(), [100.0, 99.5, 99.0])
+        self.assertEqual(bids[:, 1].tolist(), [1.0, 7.0, 2.0])
+
+    def _send_update(self, bids: list, checksum: int):
+        self.order_streamer._handle_update({
+            'market': 'BTC-PERP',
+            'data': {'time': time.time(), 'checksum': checksum, 'bids': bids, 'asks': []}
+        })
+
+    def test_checksum_validated_every_n_updates(self):
+        # stop the time interval from triggering a check
+        self.order_streamer._CHECKSUM_INTERVAL_SECS = 60
+        for i in range(self.order_streamer._CHECKSUM_EVERY_UPDATES - 1):
+            self._send_update([[97.0, float(i + 1)]], 0)
+
+        # the wrong checksum has not been checked yet
+        self.assertTrue(self.order_streamer.valid_checksums['BTC-PERP']['is_correct'])
+        self.assertNotIn('BTC-PERP', self.order_streamer.resubscribe_requests)
+
+        self._send_update([[97.0, 1.0]], 0)
+        self.assertFalse(self.order_streamer.valid_checksums['BTC-PERP']['is_correct'])
+        self.assertIn('BTC-PERP', self.order_streamer.resubscribe_requests)
+
+    def test_checksum_validated_after_interval(self):
+        self.order_streamer._CHECKSUM_INTERVAL_SECS = 0
+        order_book = self.order_streamer.order_book['BTC-PERP']
+        bids = [[100.0, 1.0], [99.0, 5.0], [98.0, 3.0]]
+        raw_string = self.order_streamer.generate_raw_checksum_string(bids, order_book['asks'])
+        self._send_update([[99.0, 5.0]], zlib.crc32(raw_string.encode()))
+
+        self.assertEqual(self.order_streamer.updates_since_checksum['BTC-PERP'], 0)
+        self.assertTrue(self.order_streamer.valid_checksums['BTC-PERP']['is_correct'])
+
+    def test_messages_handled_on_consumer_thread(self):
+        self.order_streamer._start_consumer()
+        self.order_streamer._on_message(None, json.dumps({
+            'type': 'update',
+            'market': 'BTC-PERP',
+            'data': {'time': time.time(), 'checksum': 0, 'bids': [[99.5, 7.0]], 'asks': []}
+        }))
+
+        time_start = time.time()
+        while self.order_streamer.market_checksums['BTC-PERP'] != 0 and time.time() - time_start < 1:
+            time.sleep(0.01)
+
+        self.assertEqual(self.order_streamer.get_level('BTC-PERP', 'bids', 1), [99.5, 7.0])
+
+class TestStreamerHub(unittest.TestCase):
+
+    # messages are passed to the hub directly so these do not connect
+    def test_messages_routed_by_channel(self):
+        hub = StreamerHub()
+        received = []
+        hub.register('trades', received.append)
+
+        hub._on_message(None, json.dumps({'channel': 'trades', 'market': 'BTC-PERP', 'type': 'update'}))
+        hub._on_message(None, json.dumps({'channel': 'ticker', 'market': 'BTC-PERP', 'type': 'update'}))
+        hub._on_message(None, json.dumps({'type': 'pong'}))
+
+        self.assertEqual(received, [{'channel': 'trades', 'market': 'BTC-PERP', 'type': 'update'}])
+
+    def test_duplicate_registration_raises(self):
+        hub = StreamerHub()
+        hub.register('orderbook', print, 'BTC-PERP')
+        # registering the same handler again (e.g. when resubscribing) is allowed
+        hub.register('orderbook', print, 'BTC-PERP')
+
+        with self.assertRaises(ValueError):
+            hub.register('orderbook', repr, 'BTC-PERP')
+
+    def _send_partial(self, hub: StreamerHub, ticker: str, bids: list, asks: list):
+        raw_string = OrderBookStream().generate_raw_checksum_string(bids, asks)
+        hub._on_message(None, json.dumps({
+            'channel': 'orderbook',
+            'market': ticker,
+            'type': 'partial',
+            'data': {'time': time.time(), 'checksum': zlib.crc32(raw_string.encode()), 'bids': bids, 'asks': asks}
+        }))
+
+    def _wait_for_checksum(self, order_streamer: OrderBookStream, ticker: str):
+        time_start = time.time()
+        while ticker not in order_streamer.valid_checksums and time.time() - time_start < 1:
+            time.sleep(0.01)
+
+    def test_order_book_stream_over_hub(self):
+        hub = StreamerHub()
+        order_streamer = OrderBookStream(hub)
+        # register and start handling without the hub connecting
+        order_streamer.subscribe_ticker('BTC-PERP')
+        order_streamer._start_consumer()
+
+        self._send_partial(hub, 'BTC-PERP', [[100.0, 1.0]], [[101.0, 2.0]])
+        self._wait_for_checksum(order_streamer, 'BTC-PERP')
+
+        self.assertTrue(order_streamer.valid_checksums['BTC-PERP']['is_correct'])
+
+    def test_two_order_book_streams_over_hub(self):
+        hub = StreamerHub()
+        btc_streamer = OrderBookStream(hub)
+        eth_streamer = OrderBookStream(hub)
+        for order_streamer, ticker in ((btc_streamer, 'BTC-PERP'), (eth_streamer, 'ETH-PERP')):
+            order_streamer.subscribe_ticker(ticker)
+            order_streamer._start_consumer()
+
+        self._send_partial(hub, 'BTC-PERP', [[100.0, 1.0]], [[101.0, 2.0]])
+        self._send_partial(hub, 'ETH-PERP', [[10.0, 1.0]], [[11.0, 2.0]])
+        self._wait_for_checksum(btc_streamer, 'BTC-PERP')
+        self._wait_for_checksum(eth_streamer, 'ETH-PERP')
+
+        # each stream only receives the market it subscribed to
+        self.assertEqual(list(btc_streamer.order_book), ['BTC-PERP'])
+        self.assertEqual(list(eth_streamer.order_book), ['ETH-PERP'])
+        self.assertTrue(btc_streamer.valid_checksums['BTC-PERP']['is_correct'])
+        self.assertTrue(eth_streamer.valid_checksums['ETH-PERP']['is_correct'])
+
+    def test_second_stream_cannot_take_over_market(self):
+        hub = StreamerHub()
+        OrderBookStream(hub).subscribe_ticker('BTC-PERP')
+
+        with self.assertRaises(ValueError):
+            OrderBookStream(hub).subscribe_ticker('BTC-PERP')
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
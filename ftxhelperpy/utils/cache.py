@@ -0,0 +1,113 @@
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Optional
+
+import pandas as pd
+
+def make_key(endpoint: str, params: dict) -> str:
+    """Returns a cache key for a request
+
+    Args:
+        endpoint: The endpoint of the request
+        params: Dictionary of everything else that changes the
+        result e.g. query parameters and formatting options
+
+    Returns:
+        A hex string which is the same for the same endpoint and params
+    """
+
+    raw_key = f"{endpoint}|{sorted(params.items())}".encode()
+    return hashlib.blake2b(raw_key, digest_size=16).hexdigest()
+
+def get_or_fetch(cache_dir: str, key: str, fetch_fn: Callable[[], pd.DataFrame],
+                 ttl: Optional[float] = None) -> pd.DataFrame:
+    """Returns the dataframe cached on disk under the key, or calls fetch_fn
+    and caches its result if there is no entry (or the entry has expired)
+
+    Args:
+        cache_dir: Directory the cache files are kept in. Created if it does not exist
+        key: The cache key, see make_key
+        fetch_fn: Function with no arguments which returns the dataframe
+        ttl: Number of seconds an entry is valid for. None means it never expires
+
+    Returns:
+        A pandas dataframe
+    """
+
+    cache_dir = os.path.expanduser(cache_dir)
+    path = os.path.join(cache_dir, key + '.pkl')
+
+    if os.path.exists(path):
+        if ttl is None or (time.time() - os.path.getmtime(path)) < ttl:
+            return pd.read_pickle(path)
+
+    df = fetch_fn()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first so that a failed write never leaves a partial entry.
+    # Each writer gets its own file as the same key can be fetched by several threads at once
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=key, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            df.to_pickle(tmp_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return df
+
+class MemoryCache:
+    """In-memory cache of dataframes with a maximum number of entries
+    (least recently used are dropped first) and an optional expiry"""
+
+    __slots__ = ('maxsize', 'ttl', '_entries', '_lock')
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        # number of seconds an entry is valid for. None means it never expires
+        self.ttl = ttl
+        # key -> (time the entry was added, dataframe), least recently used first
+        self._entries = OrderedDict()
+        # the fetchers can be called from several threads at once
+        self._lock = Lock()
+
+    def get_or_fetch(self, key: str, fetch_fn: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Returns the dataframe cached under the key, or calls fetch_fn
+        and caches its result if there is no entry (or the entry has expired)
+
+        Args:
+            key: The cache key, see make_key
+            fetch_fn: Function with no arguments which returns the dataframe
+
+        Returns:
+            A pandas dataframe. This is the cached object itself, so copy
+            it before handing it to anything which may modify it
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.ttl is None or (time.time() - entry[0]) < self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        # fetched outside the lock so a slow request does not hold up the other threads
+        df = fetch_fn()
+
+        with self._lock:
+            self._entries[key] = (time.time(), df)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return df
+
+    def clear(self) -> None:
+        """Removes every entry"""
+
+        with self._lock:
+            self._entries.clear()
@@ -1,8 +1,32 @@
 import hmac
 import os
-from requests import Request, Session, PreparedRequest, Response
+from requests import Session, PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 
+from functools import lru_cache
+from typing import Optional, Union
+
+try:
+    # orjson is optional but decodes large responses several times faster
+    import orjson
+    from orjson import loads
+
+    def dumps(obj) -> bytes:
+        """Encodes obj as compact json bytes. Unlike plain orjson.dumps this accepts
+        numpy numbers (e.g. an order size taken from a dataframe) and non-string keys,
+        which json.dumps accepts too"""
+
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    from json import dumps as _json_dumps, loads
+
+    def dumps(obj) -> bytes:
+        """Encodes obj as compact json bytes, the same as orjson.dumps"""
+
+        return _json_dumps(obj, separators=(',', ':')).encode()
+
 class VariableNotSet(Exception):
     """Raised when a required enviornment variable
     is not set"""
@@ -10,16 +34,76 @@ class VariableNotSet(Exception):
     def __init__(self, message):
         super().__init__(message)
 
+class FtxError(Exception):
+    """Raised when FTX responds to a request
+    with success set to false"""
+
+    def __init__(self, message):
+        super().__init__(message)
+
+def unwrap(response: dict):
+    """Returns the result of a decoded FTX response.
+
+    Args:
+        response: The decoded json of a response
+
+    Returns:
+        The 'result' field of the response
+
+    Raises:
+        FtxError: If the request was not successful. The message
+        is the error FTX returned
+    """
+
+    if not response['success']:
+        raise FtxError(response['error'])
+    return response['result']
+
 class Connector:
 
+    # sized so that concurrent fetches (e.g. get_future_prices_async) reuse pooled connections
+    _POOL_CONNECTIONS = 16
+    _POOL_MAXSIZE = 32
+    # transient failures are retried, with a backoff of 0.2s, 0.4s, ... between attempts
+    _MAX_RETRIES = 3
+    _RETRY_BACKOFF_SECS = 0.2
+    _RETRY_STATUSES = (502, 503, 504)
+
     def __init__(self):
         self.create_session()
         self.validate_env_variables()
         self.api_endpoint = os.getenv("FTX_ENDPOINT")
         self.ftx_key = os.getenv('FTX_KEY1')
+        # keyed once here rather than read from the environment and keyed for every signature.
+        # Each signature starts from a copy, which skips deriving the HMAC pads from the secret.
+        # FTX_SECRET1 is not validated above, so a missing secret only fails when signing
+        secret = os.getenv('FTX_SECRET1')
+        self._signer = None if secret is None else hmac.new(secret.encode(), digestmod='sha256')
 
     def create_session(self) -> None:
+        """Creates the session that every request is sent through. Each Connector has its
+        own session (so its headers and cookies are its own), but they all mount the same
+        pooled adapter so connections (and their TLS handshakes) are reused between
+        requests and between Connector instances"""
+
         self.session = Session()
+        adapter = _shared_adapter()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def close(self) -> None:
+        """Clears the cookies this Connector's session has collected and closes any
+        adapters mounted on it other than the shared one. The pooled connections belong
+        to the adapter shared by every Connector, so they are left open for the others
+        to keep using. The Connector itself stays usable"""
+
+        self.session.cookies.clear()
+        shared_adapter = _shared_adapter()
+        for adapter in self.session.adapters.values():
+            # Session.close would also close the shared adapter, and with it every Connector's connections
+            if adapter is not shared_adapter:
+                adapter.close()
 
     def validate_env_variables(self) -> None:
         """Validates that the required environment
@@ -46,29 +130,61 @@ class Connector:
             A PreparedRequest object
         """
 
-        ts = int(time.time() * 1000)
+        # formatted once for both the signature and the header
+        ts = str(time.time_ns() // 1_000_000)
         signature = self.get_signature(prepared_request, ts)
         prepared_request.headers['FTX-KEY'] = self.ftx_key
         prepared_request.headers['FTX-SIGN'] = signature
-        prepared_request.headers['FTX-TS'] = str(ts)
+        prepared_request.headers['FTX-TS'] = ts
         return prepared_request
 
-    def get_signature(self, prepared_request: type[PreparedRequest], ts: int) -> hmac:
+    def get_signature(self, prepared_request: type[PreparedRequest], ts: Union[int, str]) -> hmac:
         """Returns a hmac signature for a request
 
         Args:
             prepared_request: The PreparedRequest object
-            ts: The time of the request. Must match FTX-TS in request header
+            ts: The time of the request in milliseconds, as an int or the string
+            sent in the header. Must match FTX-TS in request header
 
         Returns:
             A hmac object"""
 
-        signature_payload = f'{ts}{prepared_request.method}{prepared_request.path_url}'.encode()
+        signature = self._signer.copy()
+        # the body is hashed straight after the rest of the payload rather than copied onto the end of it
+        signature.update(f'{ts}{prepared_request.method}{prepared_request.path_url}'.encode())
         if prepared_request.body:
-            signature_payload = signature_payload + prepared_request.body
+            signature.update(prepared_request.body)
+        return signature.hexdigest()
+
+    def _prepare_request(self, method: str, endpoint: str, query_params: Optional[dict] = None,
+                         payload: Optional[dict] = None) -> PreparedRequest:
+        """Builds the PreparedRequest for an endpoint directly rather than through
+        Session.prepare_request, which also merges the session params, hooks and
+        auth (including netrc) into each request. Only the session headers and cookies are used
+
+        Args:
+            method: The HTTP method e.g. 'GET'
+            endpoint: The endpoint of the request
+            query_params: A dictionary of query parameters to include in the url
+            payload: A dictionary to send as the json body, or None for no body
 
-        signature = hmac.new(os.getenv('FTX_SECRET1').encode(), signature_payload, 'sha256').hexdigest()
-        return signature
+        Returns:
+            A PreparedRequest object, not yet signed
+        """
+
+        prepared_request = PreparedRequest()
+        prepared_request.prepare_method(method)
+        prepared_request.prepare_url(self.api_endpoint + "/" + endpoint, query_params)
+        prepared_request.prepare_headers(self.session.headers)
+        prepared_request.prepare_cookies(self.session.cookies)
+        if payload is None:
+            prepared_request.prepare_body(None, None)
+        else:
+            # encoded here so orjson is used when it is installed, rather than requests' json.dumps
+            prepared_request.body = dumps(payload)
+            prepared_request.headers['Content-Type'] = 'application/json'
+            prepared_request.headers['Content-Length'] = str(len(prepared_request.body))
+        return prepared_request
 
     def auth_get_request(self, endpoint: str, query_params: dict = {}) -> Response:
         """Makes an authenticated GET request.
@@ -80,13 +196,38 @@ class Connector:
             A Response object from the GET request
         """
 
-        full_path = self.api_endpoint + "/" + endpoint
-        prepared_request = Request('GET', full_path).prepare()
-        prepared_request.prepare_url(prepared_request.url, query_params)
+        prepared_request = self._prepare_request('GET', endpoint, query_params=query_params)
         prepared_request = self.add_auth_headers(prepared_request)
         response = self.session.send(prepared_request)
         return response
 
+    def auth_get_request_raw(self, endpoint: str, query_params: dict = {}) -> bytes:
+        """Makes an authenticated GET request and returns the raw body.
+
+        Args:
+            endpoint: The endpoint of the request
+            query_params: A dictionary of query parameters to include in request
+
+        Returns:
+            The undecoded bytes of the response body
+        """
+
+        return self.auth_get_request(endpoint, query_params).content
+
+    def auth_get_json(self, endpoint: str, query_params: dict = {}) -> dict:
+        """Makes an authenticated GET request and decodes the json body.
+        Uses orjson when it is installed and the standard library otherwise.
+
+        Args:
+            endpoint: The endpoint of the request
+            query_params: A dictionary of query parameters to include in request
+
+        Returns:
+            The decoded json of the response
+        """
+
+        return loads(self.auth_get_request_raw(endpoint, query_params))
+
     def auth_post_request(self, endpoint: str, payload: dict = {}) -> Response:
         """Makes an authenticated POST request.
 
@@ -98,8 +239,7 @@ class Connector:
               A Response object from the GET request
         """
 
-        full_path = self.api_endpoint + "/" + endpoint
-        prepared_request = Request('POST', full_path, json = payload).prepare()
+        prepared_request = self._prepare_request('POST', endpoint, payload=payload)
         prepared_request = self.add_auth_headers(prepared_request)
         response = self.session.send(prepared_request)
         return response
@@ -115,8 +255,18 @@ class Connector:
               A Response object from the GET request
         """
 
-        full_path = self.api_endpoint + "/" + endpoint
-        prepared_request = Request('DELETE', full_path, json=payload).prepare()
+        prepared_request = self._prepare_request('DELETE', endpoint, payload=payload)
         prepared_request = self.add_auth_headers(prepared_request)
         response = self.session.send(prepared_request)
-        return response
\ No newline at end of file
+        return response
+
+@lru_cache(maxsize=1)
+def _shared_adapter() -> HTTPAdapter:
+    """Returns the pooled adapter shared by every Connector's session, creating it on the first call"""
+
+    # only idempotent methods are retried so an order is never placed twice.
+    # After the last attempt the response is returned as normal rather than raising
+    retries = Retry(total=Connector._MAX_RETRIES, backoff_factor=Connector._RETRY_BACKOFF_SECS,
+                    status_forcelist=Connector._RETRY_STATUSES, raise_on_status=False)
+    return HTTPAdapter(pool_connections=Connector._POOL_CONNECTIONS, pool_maxsize=Connector._POOL_MAXSIZE,
+                       max_retries=retries)
@@ -0,0 +1,92 @@
+import os
+import pandas as pd
+import shutil
+import tempfile
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ftxhelperpy.utils import cache
+
+class TestCacheMethods(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.fetch_count = 0
+
+    def fetch(self) -> pd.DataFrame:
+        self.fetch_count += 1
+        return pd.DataFrame({'time': [1, 2], 'open': [1.0, 2.0]})
+
+    def test_make_key_ignores_param_order(self):
+        key_1 = cache.make_key("markets/BTC-PERP/candles", {'start_time': 1, 'end_time': 2})
+        key_2 = cache.make_key("markets/BTC-PERP/candles", {'end_time': 2, 'start_time': 1})
+        self.assertEqual(key_1, key_2)
+
+    def test_make_key_differs_by_endpoint(self):
+        key_1 = cache.make_key("markets/BTC-PERP/candles", {'start_time': 1})
+        key_2 = cache.make_key("markets/ETH-PERP/candles", {'start_time': 1})
+        self.assertNotEqual(key_1, key_2)
+
+    def test_get_or_fetch_only_fetches_once(self):
+        first = cache.get_or_fetch(self.cache_dir, "key", self.fetch)
+        second = cache.get_or_fetch(self.cache_dir, "key", self.fetch)
+
+        self.assertEqual(self.fetch_count, 1)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_get_or_fetch_expired_entry_is_refetched(self):
+        cache.get_or_fetch(self.cache_dir, "key", self.fetch)
+        # make the entry look older than the ttl
+        path = os.path.join(self.cache_dir, "key.pkl")
+        os.utime(path, (0, 0))
+        cache.get_or_fetch(self.cache_dir, "key", self.fetch, ttl=60)
+
+        self.assertEqual(self.fetch_count, 2)
+
+    def test_get_or_fetch_concurrent_writers(self):
+        def slow_fetch():
+            # keeps the fetches overlapping so the writes race each other
+            time.sleep(0.05)
+            return self.fetch()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: cache.get_or_fetch(self.cache_dir, "key", slow_fetch), range(8)))
+
+        self.assertEqual(len(results), 8)
+        # only the entry is left behind, none of the temporary files
+        self.assertEqual(os.listdir(self.cache_dir), ["key.pkl"])
+        pd.testing.assert_frame_equal(pd.read_pickle(os.path.join(self.cache_dir, "key.pkl")), self.fetch())
+
+    def test_memory_cache_only_fetches_once(self):
+        memory_cache = cache.MemoryCache()
+        first = memory_cache.get_or_fetch("key", self.fetch)
+        second = memory_cache.get_or_fetch("key", self.fetch)
+
+        self.assertEqual(self.fetch_count, 1)
+        self.assertIs(first, second)
+
+    def test_memory_cache_expired_entry_is_refetched(self):
+        memory_cache = cache.MemoryCache(ttl=0)
+        memory_cache.get_or_fetch("key", self.fetch)
+        memory_cache.get_or_fetch("key", self.fetch)
+
+        self.assertEqual(self.fetch_count, 2)
+
+    def test_memory_cache_drops_least_recently_used(self):
+        memory_cache = cache.MemoryCache(maxsize=2)
+        memory_cache.get_or_fetch("key_1", self.fetch)
+        memory_cache.get_or_fetch("key_2", self.fetch)
+        # using key_1 again makes key_2 the least recently used
+        memory_cache.get_or_fetch("key_1", self.fetch)
+        memory_cache.get_or_fetch("key_3", self.fetch)
+        memory_cache.get_or_fetch("key_1", self.fetch)
+        self.assertEqual(self.fetch_count, 3)
+
+        memory_cache.get_or_fetch("key_2", self.fetch)
+        self.assertEqual(self.fetch_count, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
+import json
+import numpy as np
 import os
 import unittest
 
-from ftxhelperpy.utils.connect import Connector
+from unittest import mock
+
+from ftxhelperpy.utils.connect import Connector, FtxError, unwrap
 
 
 class TestConnectMethods(unittest.TestCase):
@@ -9,6 +13,7 @@ class TestConnectMethods(unittest.TestCase):
     @classmethod
     def setUpClass(cls) -> None:
         cls.connector = Connector()
+        cls.addClassCleanup(cls.connector.close)
 
     def setUp(self) -> None:
         self.connector = TestConnectMethods.connector
@@ -18,6 +23,10 @@ class TestConnectMethods(unittest.TestCase):
         is_success = response.json()['success']
         self.assertTrue(is_success)
 
+    def test_auth_get_json_is_successful(self):
+        response = self.connector.auth_get_json("subaccounts")
+        self.assertTrue(response['success'])
+
     def test_auth_post_request_is_successful(self):
         response = self.connector.auth_post_request("subaccounts", {"nickname": "test_sub_account"})
         is_success = response.json()['success']
@@ -29,12 +38,79 @@ class TestConnectMethods(unittest.TestCase):
         is_success = response.json()['success']
         self.assertTrue(is_success)
 
+    def test_unwrap_returns_result(self):
+        self.assertEqual(unwrap({'success': True, 'result': [1, 2]}), [1, 2])
+
+    def test_unwrap_unsuccessful_raises_ftx_error(self):
+        with self.assertRaises(FtxError) as context:
+            unwrap({'success': False, 'error': 'No such market: AA312'})
+        self.assertTrue('No such market' in str(context.exception))
+
     @classmethod
     def tearDownClass(cls) -> None:
         #ensures that the test sub account that was made is deleted
         cls.connector.auth_delete_request("subaccounts", {"nickname": "test_sub_account"})
 
 
+class TestPrepareRequest(unittest.TestCase):
+    # only prepares requests, so these run without a connection to FTX
+
+    def setUp(self) -> None:
+        env = {'FTX_ENDPOINT': 'https://ftx.com/api', 'FTX_KEY1': 'key', 'FTX_SECRET1': 'secret'}
+        with mock.patch.dict(os.environ, env):
+            self.connector = Connector()
+
+    def test_prepare_post_with_numpy_values(self):
+        # e.g. an order size taken from a pandas dataframe
+        payload = {'market': 'BTC-PERP', 'price': np.float64(101.5), 'size': np.float64(0.5), 1: 'a'}
+        prepared_request = self.connector._prepare_request('POST', 'orders', payload=payload)
+
+        self.assertEqual(json.loads(prepared_request.body),
+                         {'market': 'BTC-PERP', 'price': 101.5, 'size': 0.5, '1': 'a'})
+        self.assertEqual(prepared_request.headers['Content-Type'], 'application/json')
+        self.assertEqual(prepared_request.headers['Content-Length'], str(len(prepared_request.body)))
+
+class TestConnectorSession(unittest.TestCase):
+    # only creates connectors, so these run without a connection to FTX
+
+    def setUp(self) -> None:
+        env = {'FTX_ENDPOINT': 'https://ftx.com/api', 'FTX_KEY1': 'key', 'FTX_SECRET1': 'secret'}
+        with mock.patch.dict(os.environ, env):
+            self.connector = Connector()
+            self.other = Connector()
+
+    def test_connectors_share_adapter(self):
+        self.assertIsNot(self.other.session, self.connector.session)
+        self.assertIs(self.other.session.get_adapter('https://ftx.com/api'),
+                      self.connector.session.get_adapter('https://ftx.com/api'))
+
+    def test_headers_are_per_connector(self):
+        self.connector.session.headers['FTX-SUBACCOUNT'] = 'sub'
+        self.assertNotIn('FTX-SUBACCOUNT', self.other.session.headers)
+
+    def test_close_leaves_shared_pool_open(self):
+        adapter = self.other.session.get_adapter('https://ftx.com/api')
+        pool = adapter.poolmanager.connection_from_url('https://ftx.com/api')
+
+        self.connector.close()
+        self.assertIs(adapter.poolmanager.connection_from_url('https://ftx.com/api'), pool)
+
+    def test_close_clears_only_own_cookies(self):
+        self.connector.session.cookies.set('session', 'a')
+        self.other.session.cookies.set('session', 'b')
+
+        self.connector.close()
+        self.assertEqual(len(self.connector.session.cookies), 0)
+        self.assertEqual(self.other.session.cookies.get('session'), 'b')
+
+    def test_close_closes_own_adapters(self):
+        adapter = mock.Mock()
+        self.connector.session.mount('https://example.com', adapter)
+
+        self.connector.close()
+        adapter.close.assert_called_once_with()
+
+
 if __name__ == '__main__':
     unittest.main()
 